@@ -1,13 +1,36 @@
 # backend/agent/tools.py
-from typing import List, Dict, Any
+from typing import Dict, Any
 from rag.retriever import retrieve_topk
 import csv
 from pathlib import Path
 from core.settings import settings
+from services import uploads_index
 
-def retrieve_documents(query: str, top_k: int = 6) -> Dict[str, Any]:
-    """RAG fetch: return text + minimal meta for the agent to reason over."""
-    hits = retrieve_topk(query, top_k=top_k)
+def retrieve_documents(
+    query: str,
+    top_k: int = 6,
+    jurisdiction: str = "",
+    risk_level: str = "",
+    doc_type: str = "",
+    effective_from: str = "",
+    effective_to: str = "",
+) -> Dict[str, Any]:
+    """
+    RAG fetch: return text + minimal meta for the agent to reason over.
+    Optional filters narrow the search before ranking: jurisdiction,
+    risk_level or doc_type (any case), and an effective-date range
+    (YYYY-MM-DD, inclusive).
+    """
+    filters: Dict[str, Any] = {
+        "jurisdiction": jurisdiction,
+        "risk_level": risk_level,
+        "doc_type": doc_type,
+        "effective_date": {"gte": effective_from, "lte": effective_to},
+    }
+    try:
+        hits = retrieve_topk(query, top_k=top_k, filters=filters)
+    except ValueError as e:  # unparseable date from the model
+        return {"results": [], "error": str(e)}
     # Keep it compact
     return {
         "results": [
@@ -23,10 +46,14 @@ def retrieve_documents(query: str, top_k: int = 6) -> Dict[str, Any]:
 def check_policy(rule: str) -> Dict[str, Any]:
     """
     A toy 'policy checker' over the CSV (e.g., key rotation).
-    Looks into ./data/csv first CSV and returns matching rows.
+    Looks into the most recently uploaded CSV and returns matching rows.
     """
-    data_dir = Path(settings.DATA_DIR)
-    csv_files = list((data_dir / "csv").glob("*.csv"))
+    # uploads live in the blob store now; fall back to the old ./data/csv layout
+    # newest first; a few in case the latest files were deleted from disk
+    recent, _ = uploads_index.page_uploads(limit=20, file_type="csv")
+    csv_files = [Path(r["stored_path"]) for r in recent if r.get("stored_path")]
+    csv_files += list((Path(settings.DATA_DIR) / "csv").glob("*.csv"))
+    csv_files = [p for p in csv_files if p.exists()]
     if not csv_files:
         return {"matches": []}
     path = csv_files[0]
@@ -1,5 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from contextlib import asynccontextmanager
 from core.settings import settings
 from routers.chat import router as chat_router
@@ -7,15 +9,40 @@ from routers.ingest import router as ingest_router
 from routers.agent import router as agent_router
 from routers.uploads import router as uploads_router
 from routers.auth import router as auth_router
+from routers.stats import router as stats_router
 from core.database import create_db_and_tables
-import os
+from services import uploads_index
+from services.jobs import get_job_queue
+import asyncio, os
+
+JOB_LOST = "interrupted by server restart; upload again"
+
+async def _keep_leases():
+    """Renew this process's job leases; fail jobs whose owner stopped renewing (crashed or restarted)."""
+    while True:
+        await asyncio.sleep(max(1, settings.INGEST_LEASE_SECONDS // 3))
+        try:
+            await run_in_threadpool(uploads_index.renew_leases)
+            stale = await run_in_threadpool(uploads_index.fail_unfinished, JOB_LOST)
+            if stale:
+                print(f"[jobs] marked {stale} orphaned ingest job(s) as failed")
+        except Exception as e:
+            print(f"[jobs] lease renewal failed: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     os.makedirs(settings.DATA_DIR, exist_ok=True)
     os.makedirs(settings.INDEX_DIR, exist_ok=True)
     create_db_and_tables()
+    # the job queue is in memory: jobs of a process that stopped are lost. Other
+    # workers may share the index, so only jobs whose lease ran out are failed
+    stale = uploads_index.fail_unfinished(JOB_LOST)
+    if stale:
+        print(f"[jobs] marked {stale} unfinished ingest job(s) as failed")
+    keeper = asyncio.create_task(_keep_leases())
     yield
+    keeper.cancel()
+    get_job_queue().shutdown(wait=False)
 
 app = FastAPI(title="RAG Agentic Assistant Demo", lifespan=lifespan)
 
@@ -25,13 +52,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],   # GET /api/uploads paging
 )
 
+# refuse oversized uploads from the header, before the body is read and spooled;
+# bodies without a Content-Length are still capped while they are stored
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    limit = settings.MAX_UPLOAD_BYTES
+    if limit and request.method == "POST" and request.url.path == "/api/upload":
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > limit + 64 * 1024:   # + multipart framing
+            return JSONResponse({"detail": f"Upload exceeds the {limit}-byte limit"}, status_code=413)
+    return await call_next(request)
+
 app.include_router(chat_router, prefix="/api")
 app.include_router(ingest_router, prefix="/api")
 app.include_router(agent_router, prefix="/api")
 app.include_router(uploads_router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
+app.include_router(stats_router, prefix="/api")
 
 @app.get("/health")
 @app.head("/health")
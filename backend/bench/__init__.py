@@ -0,0 +1,11 @@
+"""
+Offline retrieval benchmark.
+
+    cd backend
+    python -m bench --sizes 10k,100k --queries 200
+
+Generates synthetic corpora (PDF-like prose + CSV records) with planted,
+uniquely-identifiable facts, ingests them through the normal ingest_*
+functions using the local hashing embedder, then reports per-stage
+retrieve_topk latency (p50/p95/p99) and recall@k. No network, no API key.
+"""
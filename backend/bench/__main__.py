@@ -0,0 +1,64 @@
+# backend/bench/__main__.py
+import argparse, json, os, shutil, subprocess, sys, tempfile
+from pathlib import Path
+
+from bench.run import STAGES
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _size(s: str) -> int:
+    s = s.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1:], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+
+def _table(results) -> str:
+    cols = ["total", *STAGES]
+    lines = []
+    for r in results:
+        lines.append(
+            f"\n== {r['mode']} | {r['chunks']:,} chunks ({r['size_requested']:,} requested) | ingest {r['ingest_s']}s ({r['ingest_chunks_per_s']} chunks/s)"
+            f" | recall@{r['top_k']} = {r['recall_at_k']:.3f} over {r['queries']} queries"
+        )
+        lines.append(f"{'stage':<14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for c in cols:
+            l = r["latency_ms"][c]
+            lines.append(f"{c:<14}{l['p50']:>10.2f}{l['p95']:>10.2f}{l['p99']:>10.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(prog="python -m bench", description="Offline retrieval benchmark")
+    ap.add_argument("--sizes", default="10k", help="comma-separated chunk counts, e.g. 10k,100k,1m")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--csv-share", type=float, default=0.5, help="fraction of chunks that are CSV rows")
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--cascade", action="store_true", help="benchmark the cascaded retrieval mode")
+    ap.add_argument("--workdir", type=Path, default=None, help="keep corpora/indexes here instead of a temp dir")
+    ap.add_argument("--json", type=Path, default=None, help="also write raw results to this file")
+    a = ap.parse_args(argv)
+
+    results = []
+    for size in [_size(s) for s in a.sizes.split(",") if s.strip()]:
+        root = Path(a.workdir or tempfile.mkdtemp(prefix="rag-bench-")) / f"n{size}"
+        if root.exists():
+            shutil.rmtree(root)
+        cmd = [sys.executable, "-m", "bench.run", "--size", str(size), "--workdir", str(root),
+               "--queries", str(a.queries), "--top-k", str(a.top_k),
+               "--csv-share", str(a.csv_share), "--seed", str(a.seed)] + (["--cascade"] if a.cascade else [])
+        print(f"[bench] {size:,} chunks -> {root}", file=sys.stderr)
+        out = subprocess.run(cmd, cwd=BACKEND_DIR, env=dict(os.environ), check=True,
+                             stdout=subprocess.PIPE, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+        if not a.workdir:
+            shutil.rmtree(root.parent, ignore_errors=True)
+
+    print(_table(results))
+    if a.json:
+        a.json.write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
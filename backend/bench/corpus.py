@@ -0,0 +1,123 @@
+# backend/bench/corpus.py
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Tuple
+import csv, random
+
+from rag.chunker import CHUNK_SIZE, CHUNK_OVERLAP, chunk_text
+
+SUBJECTS = ["The institution", "Each bank", "The compliance officer", "A payment service provider",
+            "The board", "Every licensed entity", "The data controller", "The relationship manager"]
+VERBS = ["must document", "shall review", "is required to report", "should verify", "must retain",
+         "shall escalate", "is expected to monitor", "must encrypt"]
+OBJECTS = ["customer due diligence records", "suspicious transaction alerts", "cross-border transfers",
+           "politically exposed person screening results", "key rotation logs", "outsourcing contracts",
+           "biometric enrolment data", "sanctions screening hits", "incident reports", "risk assessments"]
+QUALIFIERS = ["within thirty days", "on a quarterly basis", "before onboarding", "at least annually",
+              "without undue delay", "under the revised circular", "for high risk customers",
+              "in line with the AML framework"]
+JURISDICTIONS = ["Singapore", "EU", "UK", "India", "Hong Kong", "UAE"]
+RISK = ["high", "medium", "low"]
+DOC_TYPES = ["circular", "guideline", "regulation", "notice", "policy"]
+
+CSV_ROWS_PER_FILE = 5000       # rows per file; a row's text is well under CHUNK_SIZE, so one chunk each
+TXT_CHUNKS_PER_DOC = 50        # chunks of prose per "PDF"
+
+
+@dataclass
+class Fact:
+    marker: str        # unique token planted in exactly one chunk
+    query: str         # natural-ish question whose answer contains `marker`
+    kind: str          # "csv" | "txt"
+
+
+def _sentence(rng: random.Random) -> str:
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} {rng.choice(QUALIFIERS)}."
+
+def _paragraph(rng: random.Random, n: int = 6) -> str:
+    return " ".join(_sentence(rng) for _ in range(n))
+
+def _marker(rng: random.Random, i: int) -> str:
+    return f"{rng.choice('bcdfghjklmnpqrstvwxz')}{rng.choice('aeiou')}{i:06d}"
+
+def _prose(rng: random.Random, n_chunks: int, planted: str = "") -> Tuple[str, int]:
+    """
+    Paragraphs until the real chunker cuts them into at least n_chunks
+    chunks (chunk length depends on the text, so it is measured, not
+    assumed), with `planted` appended to one of them. Returns the text and
+    its chunk count.
+    """
+    paras: List[str] = []
+    length, n = 0, 0
+    per_chunk = CHUNK_SIZE // 2 - CHUNK_OVERLAP   # shortest stride; corrected once measured
+    while n < n_chunks:
+        goal = length + (n_chunks - n) * per_chunk
+        while length < goal:
+            paras.append(_paragraph(rng))
+            length += len(paras[-1]) + 2
+        if planted:
+            paras[rng.randrange(len(paras))] += planted
+            length, planted = length + len(planted), ""
+        n = len(chunk_text("\n\n".join(paras)))
+        per_chunk = max(1, length // max(1, n))
+    return "\n\n".join(paras), n
+
+def generate_corpus(root: Path, n_chunks: int, csv_share: float = 0.5,
+                    n_facts: int = 200, seed: int = 13) -> List[Fact]:
+    """
+    Write ~n_chunks worth of CSV rows (one chunk each) and prose .txt docs
+    (~TXT_CHUNKS_PER_DOC chunks each, as counted by chunk_text; a few over
+    at most) under root/csv and root/txt. Returns the planted facts used as
+    known-answer queries.
+    """
+    rng = random.Random(seed)
+    (root / "csv").mkdir(parents=True, exist_ok=True)
+    (root / "txt").mkdir(parents=True, exist_ok=True)
+
+    n_csv = int(n_chunks * csv_share)
+    n_txt = n_chunks - n_csv
+    n_docs = max(1, n_txt // TXT_CHUNKS_PER_DOC)
+    csv_facts = set(rng.sample(range(n_csv), min(n_facts // 2, n_csv))) if n_csv else set()
+    doc_facts = set(rng.sample(range(n_docs), min(n_facts - len(csv_facts), n_docs)))
+    facts: List[Fact] = []
+    fid = 0
+
+    # ---------- CSV records ----------
+    fields = ["record_id", "title", "body", "jurisdiction", "risk_level", "doc_type", "effective_date"]
+    for start in range(0, n_csv, CSV_ROWS_PER_FILE):
+        with open(root / "csv" / f"records_{start // CSV_ROWS_PER_FILE:04d}.csv", "w", newline="", encoding="utf-8") as f:
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
+            for r in range(start, min(start + CSV_ROWS_PER_FILE, n_csv)):
+                body = _paragraph(rng, 3)
+                if r in csv_facts:
+                    m = _marker(rng, fid); fid += 1
+                    obj = rng.choice(OBJECTS)
+                    body += f" Control {m} covers {obj}."
+                    facts.append(Fact(m, f"Which records does control {m} cover?", "csv"))
+                w.writerow({
+                    "record_id": f"REC-{r:07d}",
+                    "title": f"{rng.choice(DOC_TYPES).title()} on {rng.choice(OBJECTS)}",
+                    "body": body,
+                    "jurisdiction": rng.choice(JURISDICTIONS),
+                    "risk_level": rng.choice(RISK),
+                    "doc_type": rng.choice(DOC_TYPES),
+                    "effective_date": f"{rng.randint(2019, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                })
+
+    # ---------- PDF-like prose ----------
+    made = 0
+    for d in range(n_docs):
+        planted = ""
+        if d in doc_facts:
+            m = _marker(rng, fid); fid += 1
+            verb, obj = rng.choice(VERBS), rng.choice(OBJECTS)
+            planted = f" Under annex {m} the institution {verb} {obj}."
+            facts.append(Fact(m, f"What does annex {m} require the institution to do?", "txt"))
+        # what is still missing, spread over the docs left: one doc's overshoot shrinks the next
+        text, n = _prose(rng, max(1, (n_txt - made) // (n_docs - d)), planted)
+        made += n
+        (root / "txt" / f"doc_{d:06d}.txt").write_text(text, encoding="utf-8")
+
+    rng.shuffle(facts)
+    return facts
@@ -0,0 +1,95 @@
+# backend/bench/run.py
+"""
+Benchmark one corpus size in a fresh process (settings are read at import
+time, so every run needs its own environment). Prints one JSON document.
+
+    python -m bench.run --size 10000 --workdir /tmp/bench-10k
+"""
+import argparse, json, os, sys, time
+from pathlib import Path
+
+STAGES = ("embed", "chroma_query", "bm25", "chroma_get", "vector", "tfidf", "fuzzy", "mmr")
+
+
+def _configure(workdir: Path) -> None:
+    # must run before anything imports core.settings
+    os.environ["EMBED_BACKEND"] = "local"
+    os.environ["DATA_DIR"] = str(workdir / "data")
+    os.environ["INDEX_DIR"] = str(workdir / "index_store" / "chroma_db")
+    os.environ["EMBED_CACHE_PATH"] = str(workdir / "index_store" / "embed_cache.sqlite3")
+    os.environ["LEXICAL_INDEX_PATH"] = str(workdir / "index_store" / "bm25.sqlite3")
+    os.environ["MANIFEST_PATH"] = str(workdir / "index_store" / "manifest.sqlite3")
+    os.environ["OCR_CACHE_PATH"] = str(workdir / "index_store" / "ocr_cache.sqlite3")
+    os.environ["RESULT_CACHE_MAX_ITEMS"] = "0"   # measure the real pipeline, not the cache
+
+
+def _pct(values, p):
+    import numpy as np
+    return float(np.percentile(values, p) * 1000) if values else 0.0
+
+
+def run(size: int, workdir: Path, n_queries: int, top_k: int, csv_share: float, seed: int,
+        cascade: bool = False) -> dict:
+    _configure(workdir)
+    from bench.corpus import generate_corpus
+    from rag.retriever import ingest_csv_file, ingest_txt_file, _retrieve_topk, _retrieve_cascade
+    from rag.stages import StageTimer
+
+    data = workdir / "data"
+    t0 = time.perf_counter()
+    facts = generate_corpus(data, size, csv_share=csv_share, n_facts=n_queries, seed=seed)
+    gen_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    chunks = 0
+    for p in sorted((data / "csv").glob("*.csv")):
+        chunks += ingest_csv_file(p)
+    for p in sorted((data / "txt").glob("*.txt")):
+        chunks += ingest_txt_file(p)
+    ingest_s = time.perf_counter() - t0
+
+    retrieve = _retrieve_cascade if cascade else _retrieve_topk
+    per_stage = {s: [] for s in STAGES}
+    totals, hits = [], 0
+    for f in facts:
+        timer = StageTimer()
+        t0 = time.perf_counter()
+        res = retrieve(f.query, top_k=top_k, timer=timer)
+        totals.append(time.perf_counter() - t0)
+        for s in STAGES:
+            per_stage[s].append(timer.wall(s))
+        hits += any(f.marker in (r["text"] or "") for r in res)
+
+    return {
+        "size_requested": size,
+        "chunks": chunks,
+        "queries": len(facts),
+        "top_k": top_k,
+        "mode": "cascade" if cascade else "full",
+        "generate_s": round(gen_s, 2),
+        "ingest_s": round(ingest_s, 2),
+        "ingest_chunks_per_s": round(chunks / ingest_s, 1) if ingest_s else 0.0,
+        "recall_at_k": hits / len(facts) if facts else 0.0,
+        "latency_ms": {
+            s: {"p50": _pct(v, 50), "p95": _pct(v, 95), "p99": _pct(v, 99)}
+            for s, v in [("total", totals), *per_stage.items()]
+        },
+    }
+
+
+def main(argv=None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--size", type=int, required=True)
+    ap.add_argument("--workdir", type=Path, required=True)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--csv-share", type=float, default=0.5)
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--cascade", action="store_true")
+    a = ap.parse_args(argv)
+    out = run(a.size, a.workdir, a.queries, a.top_k, a.csv_share, a.seed, a.cascade)
+    json.dump(out, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
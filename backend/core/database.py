@@ -1,13 +1,24 @@
-from sqlalchemy import create_engine, Column, Integer, String
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, Boolean, Column, Float, Index, Integer, JSON, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from core.settings import settings
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
 enfine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False, "timeout": 30}
 )
 
+if enfine.dialect.name == "sqlite":
+    # ingest workers write upload status while requests read it
+    @event.listens_for(enfine, "connect")
+    def _sqlite_pragmas(conn, _):
+        cur = conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA synchronous=NORMAL")
+        cur.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=enfine)
 
 Base = declarative_base()
@@ -19,5 +30,50 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     provider = Column(String)
 
+class Upload(Base):
+    """One uploaded file and its ingest job (see services/uploads_index.py)."""
+    __tablename__ = "uploads"
+
+    id = Column(String, primary_key=True)
+    original_filename = Column(String)
+    stored_path = Column(String)
+    size_bytes = Column(Integer)
+    sha256 = Column(String, index=True)
+    file_fingerprint = Column(String)
+    file_type = Column(String, index=True)
+    created_at = Column(String, nullable=False)   # ISO-8601 UTC, as the JSON index had it
+    updated_at = Column(String)
+    ingested = Column(Boolean, nullable=False, default=False)
+    error = Column(Text)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    status = Column(String, index=True)
+    stage = Column(String)
+    progress = Column(Integer)
+    linked_to = Column(String)
+    doc_key = Column(String, index=True)   # the logical document: manifest key of its chunks
+    owner = Column(String)         # process that queued the job (uploads_index.OWNER)
+    lease_until = Column(Float)    # epoch seconds; renewed while the owner is alive
+    metrics = Column(JSON(none_as_null=True))
+    extra = Column(JSON(none_as_null=True))   # any other fields callers set
+
+    __table_args__ = (
+        # newest-first listing and its keyset cursor
+        Index("ix_uploads_created_id", "created_at", "id"),
+    )
+
+@contextmanager
+def schema_lock():
+    """
+    A connection holding the database write lock (SQLite BEGIN IMMEDIATE), so
+    only one worker process at a time creates tables or migrates data.
+    Commits on exit.
+    """
+    with enfine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        yield conn
+        conn.commit()
+
 def create_db_and_tables():
-    Base.metadata.create_all(bind=enfine)
+    with schema_lock() as conn:
+        Base.metadata.create_all(bind=conn)
@@ -1,10 +1,19 @@
 from pydantic import BaseModel
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Union, Dict
 
 class ChatRequest(BaseModel):
     query: str
     top_k: int = 5
 
+class ChatStreamRequest(ChatRequest):
+    """/chat/stream retrieves before answering; these shape that retrieval."""
+    # MMR trade-off: one value, or a per-pick schedule (e.g. [0.9, 0.7, 0.5])
+    mmr_lambda: Union[float, List[float]] = 0.65
+    mmr_pool: Optional[int] = None
+    # Metadata filters pushed into the vector query, e.g.
+    # {"jurisdiction": "Singapore", "effective_date": {"gte": "2024-01-01"}}
+    filters: Optional[Dict[str, Any]] = None
+
 class ChatResponse(BaseModel):
     answer: str
     citations: List[dict]
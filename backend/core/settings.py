@@ -21,6 +21,52 @@ class Settings(BaseSettings):
     # Paths
     DATA_DIR: str = Field(default="./data")
     INDEX_DIR: str = Field(default="./index_store/chroma_db")
+    # SQLAlchemy database (users, uploads index)
+    DATABASE_URL: str = Field(default="sqlite:///./test.db")
+
+    # Persistent BM25 inverted index (lexical candidates for hybrid retrieval)
+    LEXICAL_INDEX_PATH: str = Field(default="./index_store/bm25.sqlite3")
+    # Per-document chunk manifest (incremental re-ingest)
+    MANIFEST_PATH: str = Field(default="./index_store/manifest.sqlite3")
+
+    # OCR results per page content (SQLite; text size capped, LRU eviction)
+    OCR_CACHE_PATH: str = Field(default="./index_store/ocr_cache.sqlite3")
+    OCR_CACHE_MAX_BYTES: int = Field(default=256 * 1024 * 1024)
+
+    # retrieve_topk result cache (entries; 0 disables)
+    RESULT_CACHE_MAX_ITEMS: int = Field(default=1024)
+
+    # Cascaded retrieval (ids/distances first, full rerank on a shortlist)
+    RETRIEVAL_CASCADE: bool = Field(default=False)
+    CASCADE_MARGIN: float = Field(default=0.02)
+
+    # Threads dedicated to async retrieval (aretrieve_topk)
+    RETRIEVAL_WORKERS: int = Field(default=8)
+
+    # Embedding backend: "gemini" (network) or "local" (CPU hashing embedder)
+    EMBED_BACKEND: str = Field(default="gemini")
+    LOCAL_EMBED_DIM: int = Field(default=768)
+
+    # Answer model: "gemini" or "fake" (local canned/echo replies for tests)
+    LLM_BACKEND: str = Field(default="gemini")
+
+    # Embedding cache (SQLite on disk + bounded in-memory LRU)
+    EMBED_CACHE_PATH: str = Field(default="./index_store/embed_cache.sqlite3")
+    EMBED_CACHE_MAX_ITEMS: int = Field(default=50_000)
+
+    # Embedding requests: texts per batch call, batches in flight, retries on 429/5xx
+    EMBED_BATCH_SIZE: int = Field(default=100)
+    EMBED_CONCURRENCY: int = Field(default=4)
+    EMBED_MAX_RETRIES: int = Field(default=5)
+    # Chunks embedded + upserted per step while a document streams through ingest
+    INGEST_BATCH_SIZE: int = Field(default=256)
+    # Background ingestion: worker threads, and how many uploads may wait behind them
+    INGEST_WORKERS: int = Field(default=2)
+    INGEST_QUEUE_MAX: int = Field(default=16)
+    # A process renews the lease on its queued/running jobs; any process fails jobs whose lease ran out
+    INGEST_LEASE_SECONDS: int = Field(default=60)
+    # Largest accepted upload; bigger ones get 413
+    MAX_UPLOAD_BYTES: int = Field(default=200 * 1024 * 1024)
 
     # CORS
     CORS_ALLOW_ORIGINS: List[str] = ["*"]
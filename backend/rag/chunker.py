@@ -1,14 +1,101 @@
-from typing import List
+from typing import Iterable, Iterator, List, Tuple
+from pathlib import Path
+import codecs, mmap, re, zlib
 
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 150
 
+# Preferred cut points, best first; a cut never lands in the first half of a window
+_PARA = re.compile(r"\n\s*\n")
+_SENT = re.compile(r"[.!?;:][\"')\]]*\s+")
+_SPACE = re.compile(r"\s+")
+
+# Anchors: every paragraph end, and the sentence / word ends whose
+# preceding _ANCHOR_CONTEXT chars hash to 0 mod n (about one in n of them)
+_ANCHOR_CONTEXT = 32
+_ANCHORS = ((_PARA, 1), (_SENT, 4), (_SPACE, 24))
+
+def _anchor(window: str, min_len: int) -> int:
+    """End offset of the first anchor in `window` past min_len, or 0."""
+    for pat, n in _ANCHORS:
+        for m in pat.finditer(window, min_len):
+            context = window[max(0, m.start() - _ANCHOR_CONTEXT):m.start()]
+            if zlib.crc32(context.encode("utf-8")) % n == 0:
+                return m.end()
+    return 0
+
+def _cut(window: str, min_len: int) -> int:
+    """
+    End offset for a chunk inside `window`. The first anchor past min_len
+    if there is one: anchors depend only on the text around them, not on
+    where the window starts, so after an edit the cuts fall back onto the
+    same anchors and the chunks after it come out unchanged. Otherwise as
+    late as possible: paragraph > sentence > word > hard cut.
+    """
+    end = _anchor(window, min_len)
+    if end:
+        return end
+    for pat in (_PARA, _SENT, _SPACE):
+        last = None
+        for last in pat.finditer(window, min_len):
+            pass
+        if last is not None:
+            return last.end()
+    return len(window)
+
+def _next_start(text: str, lo: int, cut: int) -> int:
+    """Start the overlap on a word boundary at or after `lo`."""
+    m = _SPACE.search(text, lo, cut)
+    return m.end() if m else cut
+
+def iter_chunk_spans(pieces: Iterable[str], size: int = CHUNK_SIZE,
+                     overlap: int = CHUNK_OVERLAP) -> Iterator[Tuple[int, int, str]]:
+    """
+    Lazily chunk a stream of text pieces (pages, file blocks, paragraphs).
+    Pieces are concatenated as given, chunks end at paragraph/sentence/word
+    boundaries picked by content (see _cut), so an edit only changes the
+    chunks around it, and consecutive chunks share ~`overlap` chars. Yields
+    (start, end, chunk): the [start, end) offsets in the concatenated stream
+    and the stripped chunk text. Only about one piece plus one window is
+    held in memory, whatever the document size.
+    """
+    overlap = max(0, min(overlap, size // 2))
+    min_len = max(1, size // 2)
+    buf, pos, base = "", 0, 0          # base = stream offset of buf[0]
+    for piece in pieces:
+        if not piece:
+            continue
+        buf, base, pos = buf[pos:] + piece, base + pos, 0
+        while len(buf) - pos > size:
+            window = buf[pos:pos + size]
+            cut = _cut(window, min_len)
+            chunk = window[:cut].strip()
+            if chunk:
+                yield base + pos, base + pos + cut, chunk
+            pos = max(pos + 1, _next_start(buf, pos + cut - overlap, pos + cut) if overlap else pos + cut)
+    # tail: whatever is left fits in one window
+    if buf[pos:].strip():
+        yield base + pos, base + len(buf), buf[pos:].strip()
+
+def iter_chunks(pieces: Iterable[str], size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """iter_chunk_spans without the offsets."""
+    for _, _, chunk in iter_chunk_spans(pieces, size=size, overlap=overlap):
+        yield chunk
+
+def iter_file_text(path: Path, block: int = 1 << 16, encoding: str = "utf-8") -> Iterator[str]:
+    """Decode a file block by block from an mmap; never holds the whole file as str."""
+    dec = codecs.getincrementaldecoder(encoding)(errors="ignore")
+    with open(path, "rb") as f:
+        if f.seek(0, 2) == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, len(mm), block):
+                text = dec.decode(mm[start:start + block])
+                if text:
+                    yield text
+    tail = dec.decode(b"", final=True)
+    if tail:
+        yield tail
+
 def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
-    chunks = []
-    start = 0
-    n = len(text)
-    while start < n:
-        end = min(start + size, n)
-        chunks.append(text[start:end])
-        start += size - overlap
-    return [c for c in chunks if c.strip()]
+    return list(iter_chunks([text], size=size, overlap=overlap))
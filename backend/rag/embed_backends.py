@@ -0,0 +1,88 @@
+# backend/rag/embed_backends.py
+from typing import List
+import re, zlib
+import numpy as np
+from core.settings import settings
+
+
+class EmbeddingBackend:
+    """
+    Minimal interface every embedding provider implements.
+      - name: namespace for the embedding cache (vectors from different
+        models/dims must never mix).
+      - batch_size / concurrency: how embed_texts should slice and fan out.
+      - embed_batch: embed one batch, output order == input order.
+    """
+    name: str = "base"
+    batch_size: int = 100
+    concurrency: int = 1
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class GeminiBackend(EmbeddingBackend):
+    """Google Gemini embeddings over the network (batchEmbedContents)."""
+
+    def __init__(self, model: str = None):
+        import google.generativeai as genai  # only needed when this backend is selected
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self._genai = genai
+        self.model = model or settings.EMBED_MODEL
+        self.name = f"gemini:{self.model}"
+        self.batch_size = max(1, settings.EMBED_BATCH_SIZE)
+        self.concurrency = max(1, settings.EMBED_CONCURRENCY)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        resp = self._genai.embed_content(model=self.model, content=texts)
+        vecs = resp['embedding']
+        if len(vecs) != len(texts):
+            raise RuntimeError(f"embedding count mismatch: sent {len(texts)}, got {len(vecs)}")
+        return vecs
+
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+class HashingBackend(EmbeddingBackend):
+    """
+    Local CPU embedder: signed feature hashing of unigrams + bigrams,
+    log-scaled term counts, L2-normalised. Deterministic across processes
+    (crc32, not Python's salted hash), no network, no model download.
+    Lexical rather than semantic, but good enough for tests, offline
+    demos and benchmarks.
+    """
+
+    def __init__(self, dim: int = None):
+        self.dim = int(dim or settings.LOCAL_EMBED_DIM)
+        self.name = f"hashing:{self.dim}"
+        self.batch_size = 1000
+        self.concurrency = 1   # pure CPU; threads would only contend for the GIL
+
+    def _embed_one(self, text: str) -> np.ndarray:
+        toks = _TOKEN.findall((text or "").lower())
+        feats = toks + [a + " " + b for a, b in zip(toks, toks[1:])]
+        if not feats:
+            return np.zeros(self.dim, dtype=np.float32)
+        hs = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in feats),
+                         dtype=np.uint64, count=len(feats))
+        signs = np.where(hs & 1, 1.0, -1.0)
+        v = np.bincount((hs >> 1) % self.dim, weights=signs, minlength=self.dim)
+        v = np.sign(v) * np.log1p(np.abs(v))
+        n = np.linalg.norm(v)
+        return (v / n if n else v).astype(np.float32)
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed_one(t).tolist() for t in texts]
+
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "local": HashingBackend,
+    "hashing": HashingBackend,
+}
+
+def make_backend(kind: str = None) -> EmbeddingBackend:
+    kind = (kind or settings.EMBED_BACKEND or "gemini").strip().lower()
+    if kind not in BACKENDS:
+        raise ValueError(f"Unknown EMBED_BACKEND {kind!r}; expected one of {sorted(BACKENDS)}")
+    return BACKENDS[kind]()
@@ -0,0 +1,115 @@
+# backend/rag/embed_cache.py
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+import threading
+import numpy as np
+
+from rag.sqlite_store import SQLiteStore, chunked
+
+
+class EmbeddingCache(SQLiteStore):
+    """
+    Two-level embedding cache keyed by (model, sha256(text)).
+      - L1: bounded in-process LRU of float32 vectors.
+      - L2: SQLite blob table on disk (WAL mode), shared by every worker
+        and surviving restarts.
+    """
+
+    def __init__(self, path: str, max_items: int = 50_000):
+        super().__init__(path)
+        self.max_items = max(0, int(max_items))
+        self._lru: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0          # served from memory
+        self.disk_hits = 0     # served from SQLite (and promoted to memory)
+        self.misses = 0
+        self.evictions = 0
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vec BLOB NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+
+    # ---------- L1 ----------
+    def _remember(self, key: tuple, vec: np.ndarray) -> None:
+        if not self.max_items:
+            return
+        with self._lock:
+            self._lru[key] = vec
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_items:
+                self._lru.popitem(last=False)
+                self.evictions += 1
+
+    # ---------- Public API ----------
+    def get_many(self, model: str, hashes: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Return {hash: float32 vector} for every hash that is cached."""
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        with self._lock:
+            for h in dict.fromkeys(hashes):
+                vec = self._lru.get((model, h))
+                if vec is None:
+                    missing.append(h)
+                else:
+                    self._lru.move_to_end((model, h))
+                    found[h] = vec
+            self.hits += len(found)
+
+        disk = 0
+        for part in chunked(missing):
+            marks = ",".join("?" * len(part))
+            rows = self._conn().execute(
+                f"SELECT hash, vec FROM embeddings WHERE model = ? AND hash IN ({marks})",
+                [model, *part],
+            ).fetchall()
+            for h, blob in rows:
+                vec = np.frombuffer(blob, dtype=np.float32)
+                found[h] = vec
+                self._remember((model, h), vec)
+                disk += 1
+
+        with self._lock:
+            self.disk_hits += disk
+            self.misses += len(missing) - disk
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        rows = []
+        for h, v in items.items():
+            vec = np.asarray(v, dtype=np.float32)
+            rows.append((model, h, int(vec.shape[0]), vec.tobytes()))
+            self._remember((model, h), vec)
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, dim, vec) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "memory_items": len(self._lru),
+                "memory_max_items": self.max_items,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._lru.clear()
@@ -1,23 +1,99 @@
-import hashlib
-from typing import List, Dict
+import hashlib, random, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional
+import numpy as np
 from core.settings import settings
-import google.generativeai as genai
+from rag.embed_cache import EmbeddingCache
+from rag.embed_backends import EmbeddingBackend, make_backend
+from rag.singleflight import SingleFlight
+from rag.stages import StageTimer
 
-genai.configure(api_key=settings.GEMINI_API_KEY)
-_CACHE: Dict[str, List[float]] = {}
+_CACHE = EmbeddingCache(settings.EMBED_CACHE_PATH, max_items=settings.EMBED_CACHE_MAX_ITEMS)
+_BACKEND: Optional[EmbeddingBackend] = None
+_POOL: Optional[ThreadPoolExecutor] = None
+# concurrent callers missing the same batch share one backend round trip;
+# the vectors are only read (embed_texts re-lists them), so a shallow copy will do
+_FLIGHT = SingleFlight(list)
+_LOCK = threading.Lock()
+
+# Substrings of errors worth retrying (rate limits, transient server/network faults)
+_RETRYABLE = ("429", "resource exhausted", "resourceexhausted", "rate limit", "quota",
+              "500", "502", "503", "504", "unavailable", "deadline", "timeout", "timed out")
 
 def _h(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    to_query, order = [], []
-    for t in texts:
-        h = _h(t)
-        if h not in _CACHE:
-            to_query.append(t)
-            order.append(h)
-    if to_query:
-        for i, text in enumerate(to_query):
-            resp = genai.embed_content(model=settings.EMBED_MODEL, content=text)
-            _CACHE[order[i]] = resp['embedding']
-    return [_CACHE[_h(t)] for t in texts]
+def _install(backend: EmbeddingBackend) -> None:
+    global _BACKEND, _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False)
+    _POOL = (ThreadPoolExecutor(max_workers=backend.concurrency, thread_name_prefix="embed")
+             if backend.concurrency > 1 else None)
+    _BACKEND = backend
+
+def get_backend() -> EmbeddingBackend:
+    """Backend chosen by settings.EMBED_BACKEND, built on first use."""
+    with _LOCK:
+        if _BACKEND is None:
+            _install(make_backend())
+        return _BACKEND
+
+def set_backend(backend: EmbeddingBackend) -> None:
+    """Swap the backend at runtime (tests, benchmarks)."""
+    with _LOCK:
+        _install(backend)
+
+def cache_stats() -> Dict[str, float]:
+    return {**_CACHE.stats(), "coalesced": _FLIGHT.stats()}
+
+def _is_retryable(err: Exception) -> bool:
+    msg = f"{type(err).__name__} {err}".lower()
+    return any(s in msg for s in _RETRYABLE)
+
+def _embed_batch(backend: EmbeddingBackend, batch: List[str]) -> List[List[float]]:
+    """One backend round trip, with exponential backoff + jitter."""
+    for attempt in range(settings.EMBED_MAX_RETRIES + 1):
+        try:
+            return backend.embed_batch(batch)
+        except Exception as e:
+            if attempt >= settings.EMBED_MAX_RETRIES or not _is_retryable(e):
+                raise
+            time.sleep(min(30.0, 0.5 * 2 ** attempt) * (0.5 + random.random()))
+    raise RuntimeError("unreachable")
+
+def _embed_and_store(backend: EmbeddingBackend, keys: List[str], batch: List[str]) -> List[List[float]]:
+    def run() -> List[List[float]]:
+        # cache per batch so a failure late in a big ingest keeps the finished batches
+        vecs = _embed_batch(backend, batch)
+        _CACHE.put_many(backend.name, dict(zip(keys, vecs)))
+        return vecs
+    return _FLIGHT.do((backend.name, tuple(keys)), run)
+
+def embed_texts(texts: List[str], timer: Optional[StageTimer] = None) -> List[List[float]]:
+    backend = get_backend()
+    hashes = [_h(t) for t in texts]
+    found = _CACHE.get_many(backend.name, hashes)
+
+    # unique uncached texts, in first-seen order
+    todo: Dict[str, str] = {}
+    for h, text in zip(hashes, texts):
+        if h not in found and h not in todo:
+            todo[h] = text
+
+    if timer:
+        timer.count(embed_cache_hits=sum(1 for h in hashes if h in found), embed_computed=len(todo))
+    if todo:
+        keys, pending = list(todo.keys()), list(todo.values())
+        size = max(1, backend.batch_size)
+        starts = range(0, len(pending), size)
+        key_batches = [keys[i:i + size] for i in starts]
+        text_batches = [pending[i:i + size] for i in starts]
+        if _POOL is not None and len(text_batches) > 1:
+            # Executor.map yields in submission order, so vectors line up with keys
+            outs = _POOL.map(_embed_and_store, [backend] * len(text_batches), key_batches, text_batches)
+        else:
+            outs = map(_embed_and_store, [backend] * len(text_batches), key_batches, text_batches)
+        fresh = dict(zip(keys, (v for out in outs for v in out)))
+        # round-trip through float32 so cold and warm calls return identical vectors
+        found.update({h: np.asarray(v, dtype=np.float32) for h, v in fresh.items()})
+    return [found[h].tolist() for h in hashes]
@@ -0,0 +1,117 @@
+# backend/rag/filters.py
+"""
+Structured retrieval filters -> Chroma `where` clauses.
+
+    {"jurisdiction": "Singapore"}                       equality
+    {"risk_level": ["high", "medium"]}                  any of
+    {"effective_date": {"gte": "2024-01-01",
+                        "lt": "2025-01-01"}}            range
+
+Date fields are compared on the `<field>_ts` epoch-seconds metadata written
+at ingest, so ranges run inside Chroma instead of after retrieval. Text
+fields (jurisdiction, risk_level, ...) are compared case-insensitively on
+their lowercase `<field>_lc` shadows.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+DATE_FIELDS = ("effective_date", "last_updated")
+TEXT_FIELDS = ("jurisdiction", "category", "risk_level", "doc_type", "compliance_owner")
+
+_OPS = {"eq": "$eq", "ne": "$ne", "gt": "$gt", "gte": "$gte", "lt": "$lt", "lte": "$lte",
+        "in": "$in", "nin": "$nin"}
+
+_DATE_FORMATS = (
+    "%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y",
+    "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y", "%Y-%m", "%Y",
+)
+
+def ts_field(field: str) -> str:
+    return f"{field}_ts"
+
+def to_epoch(value: Any) -> Optional[int]:
+    """Best-effort date -> UTC epoch seconds; None when unparseable."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        s = str(value).strip()
+        if not s:
+            return None
+        try:
+            dt = datetime.fromisoformat(s.replace("Z", "+00:00"))
+        except ValueError:
+            dt = None
+            for fmt in _DATE_FORMATS:
+                try:
+                    dt = datetime.strptime(s, fmt)
+                    break
+                except ValueError:
+                    continue
+            if dt is None:
+                return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def date_metadata(meta: Dict[str, Any]) -> Dict[str, int]:
+    """Epoch shadow fields for whichever date fields `meta` carries."""
+    out: Dict[str, int] = {}
+    for f in DATE_FIELDS:
+        ts = to_epoch(meta.get(f))
+        if ts is not None:
+            out[ts_field(f)] = ts
+    return out
+
+def lc_field(field: str) -> str:
+    return f"{field}_lc"
+
+def text_metadata(meta: Dict[str, Any]) -> Dict[str, str]:
+    """Lowercase shadow fields for whichever text fields `meta` carries."""
+    return {lc_field(f): str(meta[f]).strip().lower()
+            for f in TEXT_FIELDS if meta.get(f) is not None and str(meta[f]).strip()}
+
+def _clause(field: str, cond: Any) -> List[Dict[str, Any]]:
+    if field in DATE_FIELDS:
+        key, conv = ts_field(field), (lambda v: _must_epoch(field, v))
+    elif field in TEXT_FIELDS:
+        key, conv = lc_field(field), (lambda v: str(v).strip().lower())
+    else:
+        key, conv = field, (lambda v: v)
+
+    if isinstance(cond, dict):
+        out = []
+        for op, v in cond.items():
+            cop = _OPS.get(str(op).lstrip("$"))
+            if cop is None:
+                raise ValueError(f"Unsupported filter operator {op!r} on {field!r}")
+            if v is None or v == "":
+                continue
+            out.append({key: {cop: [conv(x) for x in v] if cop in ("$in", "$nin") else conv(v)}})
+        return out
+    if isinstance(cond, (list, tuple, set)):
+        vals = [conv(v) for v in cond if v is not None and v != ""]
+        return [{key: {"$in": vals}}] if vals else []
+    if cond is None or cond == "":
+        return []
+    return [{key: {"$eq": conv(cond)}}]
+
+def _must_epoch(field: str, v: Any) -> int:
+    ts = to_epoch(v)
+    if ts is None:
+        raise ValueError(f"Could not parse date {v!r} for {field!r}")
+    return ts
+
+def build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Translate a filter dict to a Chroma where clause (None when empty)."""
+    if not filters:
+        return None
+    clauses: List[Dict[str, Any]] = []
+    for field, cond in filters.items():
+        clauses.extend(_clause(field, cond))
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -1,9 +1,11 @@
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-import csv
+from typing import Dict, Any, Optional, Tuple
+import csv, io
 
-from rag.store_chroma import get_collection
-from rag.embedder import embed_texts
+from rag.store_chroma import get_collection, delete_where
+from rag.manifest import get_manifest
+from rag.retriever import _Resume, _csv_records, _file_fingerprint, _ingest_stream
+from rag.stages import StageTimer
 
 # Accept multiple delimiters if Sniffer fails
 CANDIDATE_DELIMS = [',', ';', '\t', '|']
@@ -36,68 +38,70 @@ def _open_csv(path: Path):
     sample = f.read(4096); f.seek(0)
     return f, sample
 
-def _dict_reader(path: Path) -> Optional[csv.DictReader]:
+def _detect_format(path: Path) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """(encoding, csv.reader format kwargs) for the file, or None if no usable header."""
     f, sample = _open_csv(path)
+    enc = f.encoding
+    f.close()
     # Try to sniff dialect
     try:
         dialect = csv.Sniffer().sniff(sample)
-        reader = csv.DictReader(f, dialect=dialect)
+        header = next(csv.reader(io.StringIO(sample), dialect=dialect), [])
         # Ensure headers exist; if not, fall back
-        if not reader.fieldnames or all(h is None or h.strip()=="" for h in reader.fieldnames):
+        if not header or all(h is None or h.strip()=="" for h in header):
             raise ValueError("Empty headers after sniffer")
-        return reader
+        return enc, {"dialect": dialect}
     except Exception:
         # Fallback over common delimiters
-        f.close()
         for d in CANDIDATE_DELIMS:
-            f2, _ = _open_csv(path)
-            reader = csv.DictReader(f2, delimiter=d)
-            if reader.fieldnames and any(h and h.strip() for h in reader.fieldnames):
-                return reader
+            header = next(csv.reader(io.StringIO(sample), delimiter=d), [])
+            if header and any(h and h.strip() for h in header):
+                return enc, {"delimiter": d}
         return None
 
-def ingest_csv_file(path: Path) -> int:
+def ingest_csv_file(path: Path, timer: Optional[StageTimer] = None) -> int:
     """
     Turn each CSV row into a small text document and upsert.
+    Rows stream through in batches (embedding overlaps the previous batch's
+    write) with a checkpoint after each one, so memory stays flat and an
+    interrupted import resumes where it stopped.
     Returns number of rows ingested.
     """
     col = get_collection()
+    doc_key = str(path)
 
-    # Idempotent: delete any prior docs for this file
-    try:
-        existing = col.get(where={"path": str(path)}, include=[])
-        ex_ids = existing.get("ids", [])
-        if ex_ids:
-            col.delete(ids=ex_ids)
-    except Exception:
-        pass
+    # Idempotent: drop docs from before the manifest (positional ids) once;
+    # after that, re-ingests are diffed against the manifest
+    if not get_manifest().has(doc_key):
+        try:
+            delete_where(col, {"path": doc_key})
+        except Exception:
+            pass
 
-    reader = _dict_reader(path)
-    if reader is None:
+    fmt = _detect_format(path)
+    if fmt is None:
         return 0
+    encoding, dialect = fmt
+    resume = _Resume(doc_key, _file_fingerprint(path))
+    timer = timer or StageTimer()
 
-    docs: List[str] = []
-    metas: List[Dict[str, Any]] = []
-    ids: List[str] = []
-
-    # Skip an empty first row if present
-    for i, row in enumerate(reader):
-        text = _row_to_text(row)
-        # Remove aggressive length filters; index even short rows
-        if not text:
-            continue
-        ids.append(f"csv::{path.name}::row{i}")
-        metas.append({
-            "source": "csv",
-            "path": str(path),
-            "row_index": i,
-            "headers": list(reader.fieldnames or []),
-        })
-        docs.append(text)
-
-    if not docs:
-        return 0
+    def rows():
+        # runs inside _ingest_stream, after resume.load()
+        timer.count(bytes=path.stat().st_size - (resume.start or {}).get("offset", 0))
+        with path.open("rb") as raw:
+            records = _csv_records(raw, start=resume.start, encoding=encoding, **dialect)
+            for row_idx, row, pos in timer.iter("extract", records):
+                timer.count(rows=1)
+                text = _row_to_text(row)
+                # Remove aggressive length filters; index even short rows
+                if not text:
+                    continue
+                resume.pos = pos
+                yield text, {
+                    "source": "csv",
+                    "path": doc_key,
+                    "row_index": row_idx - 1,
+                    "headers": [h for h in row if h is not None],
+                }
 
-    vecs = embed_texts(docs)
-    col.upsert(documents=docs, embeddings=vecs, metadatas=metas, ids=ids)
-    return len(ids)
+    return _ingest_stream(col, doc_key, "csv", rows(), resume=resume, timer=timer)
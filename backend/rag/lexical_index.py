@@ -0,0 +1,162 @@
+# backend/rag/lexical_index.py
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Tuple
+import math, sqlite3
+import numpy as np
+
+from core.settings import settings
+from rag.rerank import tokenize
+from rag.sqlite_store import SQLiteStore, chunked, singleton
+
+
+class LexicalIndex(SQLiteStore):
+    """
+    Persistent BM25 inverted index over the chunks stored in Chroma.
+    Postings, per-doc lengths and per-term document frequencies live in
+    SQLite, so the index survives restarts and is shared by all workers.
+    Chunk ids are the Chroma ids; the ingest and delete paths keep both
+    stores in step.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75, max_df_ratio: float = 0.5):
+        super().__init__(path)
+        self.k1, self.b = k1, b
+        # terms present in more than this share of docs carry ~no BM25 weight
+        # but have huge postings lists; skip them at query time
+        self.max_df_ratio = max_df_ratio
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, len INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL, doc_id TEXT NOT NULL, tf INTEGER NOT NULL,"
+            " PRIMARY KEY (term, doc_id)) WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);"
+            "CREATE TABLE IF NOT EXISTS stats (k TEXT PRIMARY KEY, v INTEGER NOT NULL);"
+            "INSERT OR IGNORE INTO stats (k, v) VALUES ('n_docs', 0), ('total_len', 0);"
+        )
+
+    # ---------- Writes ----------
+    def _remove_in(self, conn: sqlite3.Connection, ids: Sequence[str]) -> None:
+        for part in chunked(ids):
+            marks = ",".join("?" * len(part))
+            rows = conn.execute(f"SELECT COUNT(*), COALESCE(SUM(len), 0) FROM docs WHERE id IN ({marks})", part).fetchone()
+            if not rows[0]:
+                continue
+            conn.execute(
+                f"UPDATE terms SET df = df - (SELECT COUNT(*) FROM postings p"
+                f" WHERE p.term = terms.term AND p.doc_id IN ({marks}))"
+                f" WHERE term IN (SELECT term FROM postings WHERE doc_id IN ({marks}))",
+                part + part,
+            )
+            conn.execute("DELETE FROM terms WHERE df <= 0")
+            conn.execute(f"DELETE FROM postings WHERE doc_id IN ({marks})", part)
+            conn.execute(f"DELETE FROM docs WHERE id IN ({marks})", part)
+            conn.execute("UPDATE stats SET v = v - ? WHERE k = 'n_docs'", (rows[0],))
+            conn.execute("UPDATE stats SET v = v - ? WHERE k = 'total_len'", (rows[1],))
+
+    def add(self, ids: Sequence[str], docs: Sequence[str]) -> None:
+        """Index (or re-index) documents; existing ids are replaced."""
+        if not ids:
+            return
+        doc_rows: List[Tuple[str, int]] = []
+        post_rows: List[Tuple[str, str, int]] = []
+        df: Counter = Counter()
+        for i, d in zip(ids, docs):
+            tf = Counter(tokenize(d))
+            doc_rows.append((i, sum(tf.values())))
+            post_rows.extend((t, i, c) for t, c in tf.items())
+            df.update(tf.keys())
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._remove_in(conn, list(ids))
+            conn.executemany("INSERT INTO docs (id, len) VALUES (?, ?)", doc_rows)
+            conn.executemany("INSERT INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", post_rows)
+            conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?)"
+                " ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                df.items(),
+            )
+            conn.execute("UPDATE stats SET v = v + ? WHERE k = 'n_docs'", (len(doc_rows),))
+            conn.execute("UPDATE stats SET v = v + ? WHERE k = 'total_len'", (sum(n for _, n in doc_rows),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        if not ids:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._remove_in(conn, ids)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ---------- Reads ----------
+    def count(self) -> int:
+        return int(self._conn().execute("SELECT v FROM stats WHERE k = 'n_docs'").fetchone()[0])
+
+    def matching(self, query: str, ids: Sequence[str]) -> set:
+        """Subset of `ids` containing at least one query term (TF-IDF > 0 is only possible for these)."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        ids = list(dict.fromkeys(ids))
+        if not terms or not ids:
+            return set()
+        out: set = set()
+        conn = self._conn()
+        tmarks = ",".join("?" * len(terms))
+        for part in chunked(ids):
+            rows = conn.execute(
+                f"SELECT DISTINCT doc_id FROM postings WHERE term IN ({tmarks})"
+                f" AND doc_id IN ({','.join('?' * len(part))})",
+                terms + part,
+            ).fetchall()
+            out.update(r[0] for r in rows)
+        return out
+
+    def search(self, query: str, n: int = 30) -> List[Tuple[str, float]]:
+        """Top-n (chunk_id, bm25_score), best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or n <= 0:
+            return []
+        conn = self._conn()
+        stats = dict(conn.execute("SELECT k, v FROM stats").fetchall())
+        N, total = int(stats.get("n_docs", 0)), int(stats.get("total_len", 0))
+        if N <= 0:
+            return []
+        avgdl = total / N
+
+        marks = ",".join("?" * len(terms))
+        dfs: Dict[str, int] = dict(conn.execute(f"SELECT term, df FROM terms WHERE term IN ({marks})", terms).fetchall())
+        live = [t for t in terms if t in dfs and (N < 10 or dfs[t] <= self.max_df_ratio * N)]
+        if not live:
+            return []
+        idf = {t: math.log(1 + (N - dfs[t] + 0.5) / (dfs[t] + 0.5)) for t in live}
+
+        marks = ",".join("?" * len(live))
+        rows = conn.execute(
+            f"SELECT p.doc_id, p.term, p.tf, d.len FROM postings p JOIN docs d ON d.id = p.doc_id"
+            f" WHERE p.term IN ({marks})",
+            live,
+        ).fetchall()
+        if not rows:
+            return []
+        doc_ids, r_terms, tfs, lens = zip(*rows)
+        tf = np.asarray(tfs, dtype=np.float64)
+        dl = np.asarray(lens, dtype=np.float64)
+        w = np.asarray([idf[t] for t in r_terms])
+        part = w * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / max(avgdl, 1e-9)))
+
+        uniq, inv = np.unique(np.asarray(doc_ids, dtype=object), return_inverse=True)
+        scores = np.bincount(inv, weights=part)
+        top = np.argsort(-scores)[:n]
+        return [(str(uniq[i]), float(scores[i])) for i in top]
+
+
+get_lexical_index = singleton(lambda: LexicalIndex(settings.LEXICAL_INDEX_PATH))
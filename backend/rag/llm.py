@@ -0,0 +1,108 @@
+# backend/rag/llm.py
+from typing import Iterator, List, Optional
+import re, threading, time
+from core.settings import settings
+
+
+class LLM:
+    """
+    Minimal interface every answer model implements.
+      - name: for logs.
+      - stream: yield answer text fragments as the model produces them.
+      - generate: the whole answer at once (joins stream by default).
+    """
+    name: str = "base"
+
+    def stream(self, prompt: str, system: str = "") -> Iterator[str]:
+        raise NotImplementedError
+
+    def generate(self, prompt: str, system: str = "") -> str:
+        return "".join(self.stream(prompt, system))
+
+
+class GeminiLLM(LLM):
+    """Google Gemini, streamed (generate_content(stream=True))."""
+
+    MODEL_NAMES = ["gemini-1.5-flash", "gemini-1.5-pro", "gemini-pro"]
+
+    def __init__(self, models: Optional[List[str]] = None):
+        import google.generativeai as genai  # only needed when this backend is selected
+        if not settings.GEMINI_API_KEY:
+            raise RuntimeError("Gemini API key not configured.")
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self._genai = genai
+        self.models = models or self.MODEL_NAMES
+        self.name = f"gemini:{self.models[0]}"
+
+    def stream(self, prompt: str, system: str = "") -> Iterator[str]:
+        # fall back to the next model only until the first token is out;
+        # after that a failure has to surface to the caller
+        for model_name in self.models:
+            started = False
+            try:
+                model = self._genai.GenerativeModel(model_name, system_instruction=system or None)
+                for chunk in model.generate_content(prompt, stream=True):
+                    text = getattr(chunk, "text", "")
+                    if text:
+                        started = True
+                        yield text
+                return
+            except Exception as model_error:
+                if started:
+                    raise
+                print(f"Model {model_name} failed: {model_error}")
+                continue
+        raise RuntimeError("All Gemini models failed")
+
+
+class FakeLLM(LLM):
+    """
+    Local stand-in for tests and offline demos: streams a canned reply word
+    by word (optionally with a per-token delay), or echoes the question from
+    the prompt when no reply is given.
+    """
+    name = "fake"
+
+    def __init__(self, reply: Optional[str] = None, delay: float = 0.0):
+        self.reply = reply
+        self.delay = delay
+
+    def stream(self, prompt: str, system: str = "") -> Iterator[str]:
+        text = self.reply
+        if text is None:
+            m = re.search(r"Question:\s*(.*)", prompt or "")
+            text = f"Fake answer to: {m.group(1).strip() if m else prompt}"
+        for tok in re.findall(r"\S+\s*", text):
+            if self.delay:
+                time.sleep(self.delay)
+            yield tok
+
+
+LLMS = {
+    "gemini": GeminiLLM,
+    "fake": FakeLLM,
+}
+
+def make_llm(kind: str = None) -> LLM:
+    kind = (kind or settings.LLM_BACKEND or "gemini").strip().lower()
+    if kind not in LLMS:
+        raise ValueError(f"Unknown LLM_BACKEND {kind!r}; expected one of {sorted(LLMS)}")
+    return LLMS[kind]()
+
+
+_LLM: Optional[LLM] = None
+_LOCK = threading.Lock()
+
+def get_llm() -> LLM:
+    """LLM chosen by settings.LLM_BACKEND, built on first use."""
+    global _LLM
+    with _LOCK:
+        if _LLM is None:
+            _LLM = make_llm()
+        return _LLM
+
+def set_llm(llm: LLM) -> None:
+    """Swap the answer model at runtime (tests, offline demos)."""
+    global _LLM
+    with _LOCK:
+        _LLM = llm
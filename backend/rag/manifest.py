@@ -0,0 +1,140 @@
+# backend/rag/manifest.py
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import json, time
+
+from core.settings import settings
+from rag.sqlite_store import SQLiteStore, chunked, singleton
+
+
+class ChunkManifest(SQLiteStore):
+    """
+    Which chunk ids each source document currently owns, keyed by doc_key
+    (the file path unless the caller passes something else). Re-ingest
+    diffs the new chunk ids against this set: unchanged chunks are kept,
+    only new ones are embedded and only vanished ones are deleted.
+
+    Every ingest run tags the ids it produces with its generation (`gen`),
+    so "what this run has seen" lives here rather than in memory; at the
+    end, ids still carrying an older gen are the ones that vanished.
+
+    Ids are marked before their batch is written to Chroma and dropped only
+    after their vectors are deleted, so after a crash the manifest is a
+    superset of what is stored, never a subset. The batch being written
+    is marked under a provisional (negative, per-process-run) gen and
+    promoted once stored, together with the document's checkpoint (gen +
+    reader position after that batch), so a resumed import knows exactly
+    which marks it can count on.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path)
+        conn = self._conn()
+        conn.executescript(
+            "CREATE TABLE IF NOT EXISTS manifest ("
+            " doc_key TEXT NOT NULL, chunk_id TEXT NOT NULL, gen INTEGER NOT NULL DEFAULT 0,"
+            " PRIMARY KEY (doc_key, chunk_id)) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " doc_key TEXT PRIMARY KEY, gen INTEGER NOT NULL, fingerprint TEXT NOT NULL,"
+            " position TEXT NOT NULL, updated_at REAL NOT NULL);"
+        )
+        # manifests from before generations
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(manifest)")}
+        if "gen" not in cols:
+            conn.execute("ALTER TABLE manifest ADD COLUMN gen INTEGER NOT NULL DEFAULT 0")
+
+    def ids(self, doc_key: str) -> Set[str]:
+        rows = self._conn().execute("SELECT chunk_id FROM manifest WHERE doc_key = ?", (doc_key,)).fetchall()
+        return {r[0] for r in rows}
+
+    def has(self, doc_key: str) -> bool:
+        return self._conn().execute(
+            "SELECT 1 FROM manifest WHERE doc_key = ? LIMIT 1", (doc_key,)).fetchone() is not None
+
+    def known(self, doc_key: str, ids: Iterable[str]) -> Set[str]:
+        """The subset of `ids` the document owns (any generation)."""
+        out: Set[str] = set()
+        for part in chunked(list(ids)):
+            rows = self._conn().execute(
+                f"SELECT chunk_id FROM manifest WHERE doc_key = ? AND chunk_id IN ({','.join('?' * len(part))})",
+                (doc_key, *part),
+            ).fetchall()
+            out.update(r[0] for r in rows)
+        return out
+
+    def new_gen(self) -> int:
+        return time.time_ns()
+
+    def mark(self, doc_key: str, ids: Iterable[str], gen: int) -> None:
+        """Record ids as produced by run `gen` (adding any the document did not own)."""
+        self._conn().executemany(
+            "INSERT INTO manifest (doc_key, chunk_id, gen) VALUES (?, ?, ?)"
+            " ON CONFLICT (doc_key, chunk_id) DO UPDATE SET gen = excluded.gen",
+            [(doc_key, i, gen) for i in ids],
+        )
+
+    def promote(self, doc_key: str, provisional: int, gen: int,
+                checkpoint: Optional[Tuple[str, Dict[str, Any]]] = None) -> None:
+        """Provisional marks become `gen`; with `checkpoint` = (fingerprint, position), atomically."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE manifest SET gen = ? WHERE doc_key = ? AND gen = ?", (gen, doc_key, provisional))
+            if checkpoint:
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (doc_key, gen, fingerprint, position, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (doc_key, gen, checkpoint[0], json.dumps(checkpoint[1]), time.time()),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def repeats(self, doc_key: str, gens: Sequence[int], base_ids: Iterable[str]) -> Dict[str, int]:
+        """How many ids `gens` already marked for each base id (the base plus its :2, :3, ... repeats)."""
+        out = {}
+        marks = ",".join("?" * len(gens))
+        for b in base_ids:
+            # ':' < ';' so [b, b + ';') is exactly b and b:<n>
+            out[b] = self._conn().execute(
+                f"SELECT COUNT(*) FROM manifest WHERE doc_key = ? AND gen IN ({marks}) AND chunk_id >= ? AND chunk_id < ?",
+                (doc_key, *gens, b, b + ";"),
+            ).fetchone()[0]
+        return out
+
+    def count(self, doc_key: str, gen: int) -> int:
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM manifest WHERE doc_key = ? AND gen = ?", (doc_key, gen)).fetchone()[0]
+
+    def stale(self, doc_key: str, gen: int, limit: int = 1000) -> List[str]:
+        """Up to `limit` ids of the document not produced by run `gen`."""
+        rows = self._conn().execute(
+            "SELECT chunk_id FROM manifest WHERE doc_key = ? AND gen != ? LIMIT ?", (doc_key, gen, limit)).fetchall()
+        return [r[0] for r in rows]
+
+    def discard(self, doc_key: str, ids: Iterable[str]) -> None:
+        self._conn().executemany(
+            "DELETE FROM manifest WHERE doc_key = ? AND chunk_id = ?",
+            [(doc_key, i) for i in ids],
+        )
+
+    def remove(self, doc_key: str) -> Set[str]:
+        """Forget a document; returns the chunk ids it owned."""
+        ids = self.ids(doc_key)
+        self._conn().execute("DELETE FROM manifest WHERE doc_key = ?", (doc_key,))
+        self.clear_checkpoint(doc_key)
+        return ids
+
+    # ---------- Checkpoints ----------
+    def checkpoint(self, doc_key: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT gen, fingerprint, position FROM checkpoints WHERE doc_key = ?", (doc_key,)).fetchone()
+        if row is None:
+            return None
+        return {"gen": row[0], "fingerprint": row[1], "position": json.loads(row[2])}
+
+    def clear_checkpoint(self, doc_key: str) -> None:
+        self._conn().execute("DELETE FROM checkpoints WHERE doc_key = ?", (doc_key,))
+
+
+get_manifest = singleton(lambda: ChunkManifest(settings.MANIFEST_PATH))
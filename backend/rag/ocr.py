@@ -1,58 +1,355 @@
 # backend/rag/ocr.py
 from pathlib import Path
-import os
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Iterator, Optional
+import hashlib, multiprocessing, os, threading
+import numpy as np
+from PIL import Image, ImageOps
 from pypdf import PdfReader
 from pdf2image import convert_from_path
 import pytesseract
+from rag.ocr_cache import get_ocr_cache
+from rag.stages import StageTimer
 
 # Read env config
 POPPLER_PATH = os.getenv("POPPLER_PATH") or None
 TESSERACT_CMD = os.getenv("TESSERACT_CMD") or None
 OCR_DPI = int(os.getenv("OCR_DPI") or "300")
 OCR_LANG = os.getenv("OCR_LANG") or "eng"
+# Tesseract worker processes, and pages rendered/queued at once (bounds memory)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS") or os.cpu_count() or 1)
+OCR_MAX_INFLIGHT = int(os.getenv("OCR_MAX_INFLIGHT") or 2 * OCR_WORKERS)
+# Pages whose native text layer is thinner than this get OCR'd
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS") or "100")
+# Adaptive mode: OCR at OCR_LOW_DPI after cleanup, re-render at OCR_DPI only
+# when mean word confidence is below OCR_MIN_CONFIDENCE (0-100)
+OCR_ADAPTIVE = (os.getenv("OCR_ADAPTIVE") or "false").strip().lower() in ("1", "true", "yes", "on")
+OCR_LOW_DPI = int(os.getenv("OCR_LOW_DPI") or "150")
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE") or "75")
 
 # On Windows you must set this
 if TESSERACT_CMD:
     pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
 
-def read_pdf_text(path: Path, max_pages: int = 300) -> str:
-    """Extract text from native PDFs (has selectable text)."""
+def _page_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+def iter_pdf_pages(path: Path, max_pages: int = 300) -> Iterator[str]:
+    """Native text of each page, one page at a time."""
     reader = PdfReader(str(path))
-    out = []
     for page in reader.pages[:max_pages]:
-        try:
-            out.append(page.extract_text() or "")
-        except Exception:
-            out.append("")
-    return "\n".join(out)
+        yield _page_text(page)
+
+def read_pdf_text(path: Path, max_pages: int = 300) -> str:
+    """Extract text from native PDFs (has selectable text)."""
+    return "\n".join(iter_pdf_pages(path, max_pages=max_pages))
 
 def ocr_pdf_to_text(path: Path, max_pages: int = 300) -> str:
     """OCR for scanned PDFs: render pages to images with Poppler, then Tesseract."""
-    kwargs = {"dpi": OCR_DPI}
+    return "\n".join(iter_ocr_pages(path, max_pages=max_pages))
+
+def iter_ocr_pages(path: Path, max_pages: int = 300) -> Iterator[str]:
+    """OCR text of every page, in order (cached pages come back without rendering)."""
+    for page in iter_page_texts(path, max_pages=max_pages, force_ocr=True):
+        yield page.text
+
+# ---------- Adaptive-resolution OCR ----------
+def _render(path: str, page_no: int, dpi: int, grayscale: bool = False) -> Optional[Image.Image]:
+    kwargs = {"dpi": dpi, "first_page": page_no, "last_page": page_no, "grayscale": grayscale}
     # pdf2image wants poppler_path on Windows
     if POPPLER_PATH:
         kwargs["poppler_path"] = POPPLER_PATH
+    images = convert_from_path(path, **kwargs)
+    return images[0] if images else None
 
-    images = convert_from_path(str(path), **kwargs)
-    texts = []
-    for img in images[:max_pages]:
+def _binarize(gray: np.ndarray) -> np.ndarray:
+    """Otsu threshold -> bool array, True = ink."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    w0 = np.cumsum(hist)
+    m0 = np.cumsum(hist * np.arange(256))
+    total, mean = w0[-1], m0[-1]
+    w1 = total - w0
+    between = (mean * w0 - m0 * total) ** 2 / np.maximum(w0 * w1, 1e-9)
+    return gray <= int(np.argmax(between))
+
+def _skew_angle(ink: np.ndarray, max_deg: float = 5.0, step: float = 0.5) -> float:
+    """Angle whose row-projection profile is sharpest (text lines horizontal)."""
+    small = Image.fromarray((ink * 255).astype(np.uint8))
+    small.thumbnail((800, 800))
+    best, best_score = 0.0, -1.0
+    for a in np.arange(-max_deg, max_deg + step / 2, step):
+        rows = np.asarray(small.rotate(float(a), fillcolor=0), dtype=np.float64).sum(axis=1)
+        score = float(np.var(rows))
+        if score > best_score:
+            best, best_score = float(a), score
+    return best
+
+def _preprocess(img: Image.Image) -> Image.Image:
+    """Grayscale, Otsu binarisation and deskew; cheap next to Tesseract itself."""
+    gray = np.asarray(ImageOps.grayscale(img), dtype=np.uint8)
+    ink = _binarize(gray)
+    angle = _skew_angle(ink)
+    out = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+    if angle:
+        out = out.rotate(angle, expand=True, fillcolor=255)
+    return out
+
+def _ocr_with_confidence(img: Image.Image, lang: str):
+    """(text, mean word confidence); layout rebuilt from image_to_data's block/par/line ids."""
+    d = pytesseract.image_to_data(img, lang=lang, output_type=pytesseract.Output.DICT)
+    lines, confs, weights = {}, [], []
+    for i, word in enumerate(d["text"]):
+        word = (word or "").strip()
+        conf = float(d["conf"][i])
+        if not word or conf < 0:
+            continue
+        lines.setdefault((d["block_num"][i], d["par_num"][i], d["line_num"][i]), []).append(word)
+        confs.append(conf)
+        weights.append(len(word))
+    text, prev = [], None
+    for (block, par, _), words in lines.items():
+        if prev is not None and (block, par) != prev:
+            text.append("")          # blank line between paragraphs
+        text.append(" ".join(words))
+        prev = (block, par)
+    mean = float(np.average(confs, weights=weights)) if confs else 0.0
+    return "\n".join(text), mean
+
+def _ocr_adaptive(path: str, page_no: int, dpi: int, lang: str, low_dpi: int, min_conf: float) -> Optional[str]:
+    low = _render(path, page_no, low_dpi, grayscale=True)
+    if low is None:
+        return None
+    text, conf = _ocr_with_confidence(_preprocess(low), lang)
+    if conf >= min_conf or low_dpi >= dpi:
+        return text
+    # escalate: full resolution, same cleanup; keep whichever read better
+    high = _render(path, page_no, dpi, grayscale=True)
+    if high is None:
+        return text
+    text_hi, conf_hi = _ocr_with_confidence(_preprocess(high), lang)
+    return text_hi if conf_hi >= conf else text
+
+# ---------- OCR pipeline ----------
+def _ocr_page(path: str, page_no: int, dpi: int, lang: str,
+              low_dpi: int = 0, min_conf: float = 0.0) -> Optional[str]:
+    """
+    Render one page (1-based) and OCR it. Runs inside a worker process; None
+    on failure. low_dpi > 0 selects adaptive mode (see _ocr_adaptive).
+    """
+    try:
+        if low_dpi:
+            return _ocr_adaptive(path, page_no, dpi, lang, low_dpi, min_conf)
+        img = _render(path, page_no, dpi)
+        if img is None:
+            return None
+        return pytesseract.image_to_string(img, lang=lang) or ""
+    except Exception as e:
+        print(f"[ocr] page {page_no} of {path} failed: {e}")
+        return None
+
+def _ocr_job(path: Path, page_no: int) -> tuple:
+    if OCR_ADAPTIVE:
+        return (str(path), page_no, OCR_DPI, OCR_LANG, OCR_LOW_DPI, OCR_MIN_CONFIDENCE)
+    return (str(path), page_no, OCR_DPI, OCR_LANG)
+
+def _ocr_mode() -> str:
+    """Everything besides the page itself that changes OCR output (part of the cache key)."""
+    if OCR_ADAPTIVE:
+        return f"adaptive:{OCR_LOW_DPI}:{OCR_DPI}:{OCR_MIN_CONFIDENCE:g}"
+    return f"fixed:{OCR_DPI}"
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def _get_pool() -> Optional[Executor]:
+    global _POOL
+    if OCR_WORKERS <= 1:
+        return None
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn, not fork: the API process is multi-threaded
+            _POOL = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+def _drop_pool(broken: Executor) -> None:
+    """A worker died (e.g. OOM-killed on a huge scan): forget the pool so the next call starts a new one."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is broken:
+            _POOL = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def _submit(job: tuple) -> tuple:
+    """(pool, future) for an OCR job, replacing the pool once if it turns out broken."""
+    pool = _get_pool()
+    try:
+        return pool, pool.submit(_ocr_page, *job)
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        pool = _get_pool()
+        return pool, pool.submit(_ocr_page, *job)
+
+def _ocr_result(pool: Executor, fut: Future, job: tuple) -> Optional[str]:
+    """The job's text; if its pool broke, retry the page once on a fresh one (None if that breaks too)."""
+    try:
+        return fut.result()
+    except BrokenProcessPool:
+        _drop_pool(pool)
+    print(f"[ocr] worker died on page {job[1]} of {job[0]}; retrying once")
+    try:
+        pool, fut = _submit(job)
+        return fut.result()
+    except BrokenProcessPool:
+        _drop_pool(pool)
+        print(f"[ocr] page {job[1]} of {job[0]} failed again; keeping its text layer")
+        return None
+
+def _hash_xobjects(h, resources, seen: set, depth: int = 0) -> None:
+    if resources is None or depth > 4:
+        return
+    xobjs = resources.get_object().get("/XObject")
+    if xobjs is None:
+        return
+    xobjs = xobjs.get_object()
+    for name in sorted(xobjs):
+        ref = xobjs[name]
+        h.update(name.encode("utf-8", "ignore"))
+        ident = getattr(ref, "idnum", None)
+        if ident is not None:
+            if ident in seen:        # shared/recursive forms: hash once
+                continue
+            seen.add(ident)
+        obj = ref.get_object()
         try:
-            txt = pytesseract.image_to_string(img, lang=OCR_LANG) or ""
+            h.update(obj.get_data())
         except Exception:
-            txt = ""
-        texts.append(txt)
-    return "\n".join(texts)
+            h.update(getattr(obj, "_data", b"") or b"")
+        if obj.get("/Subtype") == "/Form":
+            _hash_xobjects(h, obj.get("/Resources"), seen, depth + 1)
+
+def page_cache_key(page, mode: str, lang: str) -> Optional[str]:
+    """
+    sha256 over what the page renders from: content stream, XObjects (scanned
+    images, nested forms) and geometry, plus the OCR settings. None if the
+    page can't be hashed (then it is simply not cached).
+    """
+    try:
+        h = hashlib.sha256(f"{mode}|{lang}|{list(page.mediabox)}|{page.get('/Rotate', 0)}|".encode())
+        contents = page.get_contents()
+        h.update(contents.get_data() if contents is not None else b"")
+        _hash_xobjects(h, page.get("/Resources"), set())
+        return h.hexdigest()
+    except Exception as e:
+        print(f"[ocr] page hash failed: {e}")
+        return None
+
+def ocr_cache_stats():
+    return get_ocr_cache().stats()
+
+@dataclass
+class PageText:
+    number: int   # 1-based
+    text: str
+    method: str   # "native" | "ocr"
+
+def iter_page_texts(path: Path, max_pages: int = 300, force_ocr: bool = False,
+                    timer: Optional[StageTimer] = None) -> Iterator[PageText]:
+    """
+    Per-page hybrid extraction, in page order: pages with a usable native
+    text layer (>= OCR_MIN_PAGE_CHARS) are taken as-is, only the thin or
+    empty ones (all of them with force_ocr) are OCR'd. OCR results come
+    from the page cache when possible, otherwise the page is rendered and
+    OCR'd on the worker pool. Pages behind a pending OCR page wait in a
+    queue bounded by OCR_MAX_INFLIGHT.
+
+    With a timer: "extract" is text-layer reading and page hashing, "ocr"
+    the time spent OCRing inline or waiting on the pool; counts pages,
+    pages_ocr and ocr_cache_hits.
+    """
+    timer = timer or StageTimer()
+    pool = _get_pool()
+    cache = get_ocr_cache()
+    queue: deque = deque()   # PageText, or (number, native, cache key, job, pool, Future)
+    pending = 0
+
+    def finish(number: int, native: str, ocr: Optional[str], key: Optional[str]) -> PageText:
+        timer.count(pages_ocr=1)
+        if ocr is not None and key:
+            cache.put(key, ocr)
+        ocr = ocr or ""
+        # a thin text layer can still beat a failed OCR; label the page by the text kept
+        if ocr.strip() and len(ocr.strip()) >= len(native.strip()):
+            return PageText(number, ocr, "ocr")
+        return PageText(number, native, "native")
+
+    reader = PdfReader(str(path))
+    try:
+        for i, page in enumerate(reader.pages[:max_pages]):
+            timer.count(pages=1)
+            with timer.stage("extract"):
+                native = "" if force_ocr else _page_text(page)
+                thin = len(native.strip()) < OCR_MIN_PAGE_CHARS
+                key = page_cache_key(page, _ocr_mode(), OCR_LANG) if thin else None
+                cached = cache.get(key) if key else None
+            if not thin:
+                queue.append(PageText(i + 1, native, "native"))
+            else:
+                job = _ocr_job(path, i + 1)
+                if cached is not None:
+                    timer.count(ocr_cache_hits=1)
+                    queue.append(finish(i + 1, native, cached, None))
+                elif pool is None:
+                    with timer.stage("ocr"):
+                        text = _ocr_page(*job)
+                    queue.append(finish(i + 1, native, text, key))
+                else:
+                    queue.append((i + 1, native, key, job, *_submit(job)))
+                    pending += 1
+            # emit everything ready at the head; block on OCR only when too many are queued
+            while queue and (isinstance(queue[0], PageText) or pending >= max(1, OCR_MAX_INFLIGHT)):
+                item = queue.popleft()
+                if not isinstance(item, PageText):
+                    pending -= 1
+                    with timer.stage("ocr"):
+                        text = _ocr_result(*item[4:], item[3])
+                    item = finish(item[0], item[1], text, item[2])
+                yield item
+        while queue:
+            item = queue.popleft()
+            if not isinstance(item, PageText):
+                with timer.stage("ocr"):
+                    text = _ocr_result(*item[4:], item[3])
+                item = finish(item[0], item[1], text, item[2])
+            yield item
+    finally:
+        for item in queue:
+            if not isinstance(item, PageText):
+                item[5].cancel()
 
 def smart_pdf_extract(path: Path, max_pages: int = 300) -> tuple[str, dict]:
     """
-    Try native text first; if too short (or empty), fall back to OCR.
+    Native text per page, OCR for pages without a usable text layer.
     Return (text, metadata).
     """
     meta = {"path": str(path), "used_ocr": False, "dpi": OCR_DPI, "lang": OCR_LANG}
-    native = read_pdf_text(path, max_pages=max_pages)
-    # If native text is too small (typical for scanned PDFs), OCR it
-    if len(native.strip()) >= 200:
-        return native, meta
-    ocr = ocr_pdf_to_text(path, max_pages=max_pages)
-    meta["used_ocr"] = True
-    return ocr, meta
+    texts = []
+    for page in iter_page_texts(path, max_pages=max_pages):
+        texts.append(page.text)
+        meta["used_ocr"] = meta["used_ocr"] or page.method == "ocr"
+    return "\n".join(texts), meta
+
+def smart_pdf_pages(path: Path, max_pages: int = 300,
+                    timer: Optional[StageTimer] = None) -> tuple[Iterator[PageText], dict]:
+    """
+    Streaming smart_pdf_extract: (PageText iterator, document metadata).
+    Whether OCR was used is per page (PageText.method), not per document.
+    """
+    page_count = min(len(PdfReader(str(path)).pages), max_pages)
+    meta = {"path": str(path), "dpi": OCR_DPI, "lang": OCR_LANG, "page_count": page_count}
+    return iter_page_texts(path, max_pages=max_pages, timer=timer), meta
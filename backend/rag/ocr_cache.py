@@ -0,0 +1,102 @@
+# backend/rag/ocr_cache.py
+from typing import Dict, Optional
+import sqlite3, threading, time
+
+from core.settings import settings
+from rag.sqlite_store import SQLiteStore, singleton
+
+
+class OcrCache(SQLiteStore):
+    """
+    On-disk OCR results keyed by a hash of what the page renders from (its
+    content stream + XObjects) and the OCR settings, so re-ingests and pages
+    shared across documents skip Poppler + Tesseract. Total text size is
+    capped at max_bytes; least-recently-used pages are evicted first.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        super().__init__(path)
+        self.max_bytes = max(0, int(max_bytes))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn().executescript(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS pages_lru ON pages (last_used);"
+            "CREATE TABLE IF NOT EXISTS stats (k TEXT PRIMARY KEY, v INTEGER NOT NULL);"
+            "INSERT OR IGNORE INTO stats (k, v) VALUES ('bytes', 0);"
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._conn()
+        row = conn.execute("SELECT text FROM pages WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, text: str) -> None:
+        if not self.max_bytes:
+            return
+        size = len(text.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = conn.execute("SELECT size FROM pages WHERE key = ?", (key,)).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO pages (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, text, size, time.time()),
+            )
+            conn.execute("UPDATE stats SET v = v + ? WHERE k = 'bytes'", (size - (old[0] if old else 0),))
+            total = conn.execute("SELECT v FROM stats WHERE k = 'bytes'").fetchone()[0]
+            if total > self.max_bytes:
+                total = self._evict(conn, total, int(self.max_bytes * 0.9))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection, total: int, target: int) -> int:
+        # oldest first, in pages of rows, until back under target
+        while total > target:
+            rows = conn.execute("SELECT key, size FROM pages ORDER BY last_used LIMIT 256").fetchall()
+            if not rows:
+                break
+            freed, keys = 0, []
+            for k, sz in rows:
+                if total - freed <= target:
+                    break
+                keys.append((k,))
+                freed += sz
+            conn.executemany("DELETE FROM pages WHERE key = ?", keys)
+            conn.execute("UPDATE stats SET v = v - ? WHERE k = 'bytes'", (freed,))
+            total -= freed
+            with self._lock:
+                self.evictions += len(keys)
+        return total
+
+    def stats(self) -> Dict[str, float]:
+        conn = self._conn()
+        items = conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+        size = conn.execute("SELECT v FROM stats WHERE k = 'bytes'").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": items,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+get_ocr_cache = singleton(lambda: OcrCache(settings.OCR_CACHE_PATH, settings.OCR_CACHE_MAX_BYTES))
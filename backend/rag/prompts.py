@@ -2,3 +2,13 @@ SYSTEM_PROMPT = (
     "You are a precise assistant for a regulated industry. "
     "Answer ONLY from the provided context. If the answer is not in the context, say you don't know."
 )
+
+def build_prompt(question: str, hits) -> str:
+    """Numbered context blocks ([1], [2], ...) matching the citation order, then the question."""
+    blocks = []
+    for n, h in enumerate(hits, 1):
+        meta = h.get("meta") or {}
+        src = meta.get("file_name") or meta.get("csv_file") or h.get("id", "")
+        blocks.append(f"[{n}] ({src})\n{h.get('text', '')}")
+    context = "\n\n".join(blocks) if blocks else "(no matching documents)"
+    return f"Context:\n{context}\n\nQuestion: {question}"
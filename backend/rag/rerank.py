@@ -0,0 +1,136 @@
+# backend/rag/rerank.py
+"""
+Batched scorers for the hybrid rerank stage of retrieve_topk.
+Each function scores a whole candidate pool at once and returns a float64
+array aligned with the input order.
+"""
+from itertools import chain
+from typing import Any, Dict, List, Sequence, Union
+import re
+import numpy as np
+from rapidfuzz import fuzz, process
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+def tokenize(s: str) -> List[str]:
+    return _TOKEN.findall((s or "").lower())
+
+def vector_scores(qvec: Sequence[float], embs: Sequence[Sequence[float]]) -> np.ndarray:
+    """Cosine of every candidate embedding against the query: one mat-vec."""
+    E = np.asarray(embs, dtype=np.float64)
+    q = np.asarray(qvec, dtype=np.float64)
+    if E.size == 0:
+        return np.zeros(0)
+    return (E @ q) / (np.linalg.norm(E, axis=1) * np.linalg.norm(q) + 1e-9)
+
+def tfidf_scores(query: str, docs: Sequence[str]) -> np.ndarray:
+    """
+    TF-IDF cosine of the query against each doc, fitted on the pool itself
+    (tf = count / doc_len, idf = ln((N+1)/(1+df)) + 1). The doc-term matrix is
+    kept in coordinate form (row, col, value) so nothing vocabulary-sized is
+    materialised per document.
+    """
+    n_docs = len(docs)
+    if not n_docs:
+        return np.zeros(0)
+    d_toks = [tokenize(d) for d in docs]
+    lens = np.fromiter((len(t) for t in d_toks), dtype=np.int64, count=n_docs)
+    if not lens.sum():
+        return np.zeros(n_docs)
+
+    flat = np.asarray(list(chain.from_iterable(d_toks)), dtype=str)
+    vocab, term_ids = np.unique(flat, return_inverse=True)
+    V = len(vocab)
+    doc_ids = np.repeat(np.arange(n_docs), lens)
+
+    # (doc, term) -> count
+    cells, counts = np.unique(doc_ids * V + term_ids, return_counts=True)
+    rows, cols = cells // V, cells % V
+
+    N = max(1, n_docs)
+    df = np.bincount(cols, minlength=V)
+    idf = np.log((N + 1) / (1 + df)) + 1.0
+    vals = counts / np.maximum(1, lens[rows]) * idf[cols]
+    d_norm = np.sqrt(np.bincount(rows, weights=vals * vals, minlength=n_docs))
+
+    # query vector: in-vocab terms go into a dense V-vector, unseen terms (df=0)
+    # only contribute to its norm
+    qtok = tokenize(query)
+    q_dense = np.zeros(V)
+    q_norm_sq = 0.0
+    if qtok:
+        q_terms, q_counts = np.unique(np.asarray(qtok, dtype=str), return_counts=True)
+        pos = np.searchsorted(vocab, q_terms)
+        hit = (pos < V) & (vocab[np.minimum(pos, V - 1)] == q_terms)
+        q_w = q_counts / len(qtok)
+        q_dense[pos[hit]] = q_w[hit] * idf[pos[hit]]
+        oov = q_w[~hit] * (np.log(N + 1) + 1.0)
+        q_norm_sq = float(q_dense @ q_dense + oov @ oov)
+
+    dots = np.bincount(rows, weights=vals * q_dense[cols], minlength=n_docs)
+    return dots / ((np.sqrt(q_norm_sq) + 1e-9) * (d_norm + 1e-9))
+
+def fuzzy_scores(query: str, docs: Sequence[str], workers: int = -1) -> np.ndarray:
+    """token_set_ratio / 100 for every doc via rapidfuzz's batched cdist."""
+    if not docs:
+        return np.zeros(0)
+    m = process.cdist([query], list(docs), scorer=fuzz.token_set_ratio,
+                      dtype=np.float64, workers=workers)
+    return m[0] / 100.0
+
+BOOST_OCR, BOOST_JURISDICTION, BOOST_RISK = 0.04, 0.05, 0.05
+
+def domain_boosts(query: str, metas: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Small metadata boosts so OCR / jurisdiction / risk hits aren't drowned out."""
+    boosts = np.zeros(len(metas))
+    low = (query or "").lower()
+    want_sg = "singapore" in low
+    want_risk = "risk" in low
+    for i, m in enumerate(metas):
+        m = m or {}
+        st = (m.get("source_type") or m.get("source") or "").lower()
+        if "ocr" in st:
+            boosts[i] += BOOST_OCR
+        if want_sg and str(m.get("jurisdiction", "")).lower() == "singapore":
+            boosts[i] += BOOST_JURISDICTION
+        if want_risk and str(m.get("risk_level", "")).lower() == "high":
+            boosts[i] += BOOST_RISK
+    return boosts
+
+def max_domain_boost(query: str) -> float:
+    """Upper bound of domain_boosts(query, ...) for any chunk."""
+    low = (query or "").lower()
+    return BOOST_OCR + BOOST_JURISDICTION * ("singapore" in low) + BOOST_RISK * ("risk" in low)
+
+def mmr(candidates: Sequence[int], qvec: Sequence[float], embs: Sequence[Sequence[float]],
+        k: int = 5, lam: Union[float, Sequence[float]] = 0.65) -> List[int]:
+    """
+    Maximal Marginal Relevance over `candidates` (indices into `embs`).
+    The candidate-by-candidate cosine matrix is computed once; a running
+    max-similarity-to-chosen vector is updated after every pick, so each
+    step is O(n) instead of O(n * |chosen|) cosine calls.
+    `lam` may be a single value or a per-pick schedule (the last entry is
+    reused once the schedule runs out).
+    """
+    cand = list(dict.fromkeys(candidates))
+    if not cand or k <= 0:
+        return []
+    E = np.asarray([embs[i] for i in cand], dtype=np.float64)
+    norms = np.linalg.norm(E, axis=1)
+    q = np.asarray(qvec, dtype=np.float64)
+    sim_q = (E @ q) / (norms * np.linalg.norm(q) + 1e-9)
+    sim = (E @ E.T) / (np.outer(norms, norms) + 1e-9)
+
+    sched = [float(lam)] if np.isscalar(lam) else [float(x) for x in lam] or [0.65]
+    max_div = np.zeros(len(cand))          # no penalty until something is chosen
+    taken = np.zeros(len(cand), dtype=bool)
+    chosen: List[int] = []
+    for step in range(min(k, len(cand))):
+        l = sched[min(step, len(sched) - 1)]
+        score = l * sim_q - (1 - l) * max_div
+        score[taken] = -np.inf
+        best = int(np.argmax(score))
+        taken[best] = True
+        chosen.append(cand[best])
+        max_div = sim[best] if step == 0 else np.maximum(max_div, sim[best])
+    return chosen
@@ -0,0 +1,71 @@
+# backend/rag/result_cache.py
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import json, threading
+
+
+class ResultCache:
+    """
+    Bounded LRU of retrieve_topk results. Every entry remembers the
+    collection version it was computed against; a lookup under any other
+    version is a miss (and drops the entry), so an upsert/delete anywhere
+    invalidates everything without having to track which queries it touched.
+    """
+
+    def __init__(self, max_items: int = 1024):
+        self.max_items = max(0, int(max_items))
+        self._items: "OrderedDict[str, Tuple[str, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        return json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+
+    @staticmethod
+    def _copy(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # callers may mutate hits/meta; never hand out the cached objects
+        return [{**r, "meta": dict(r.get("meta") or {})} for r in results]
+
+    def get(self, key: str, version: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            if item[0] != version:
+                del self._items[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            results = item[1]
+        return self._copy(results)
+
+    def put(self, key: str, version: str, results: List[Dict[str, Any]]) -> None:
+        if not self.max_items:
+            return
+        with self._lock:
+            self._items[key] = (version, self._copy(results))
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "items": len(self._items),
+                "max_items": self.max_items,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -1,15 +1,36 @@
 from pathlib import Path
-from typing import List, Dict, Any, Iterable
-from rag.ocr import smart_pdf_extract
-from rag.chunker import chunk_text
+from typing import List, Dict, Any, BinaryIO, Callable, Iterable, Iterator, Optional, Sequence, Tuple, Union
+from rag.ocr import PageText, smart_pdf_pages
+from rag.chunker import chunk_text, iter_chunks, iter_chunk_spans, iter_file_text
 from rag.embedder import embed_texts
-from rag.store_chroma import get_collection
-from rapidfuzz import fuzz
+from rag.store_chroma import (
+    get_collection, upsert_chunks, update_metadatas, delete_chunks, delete_where, where_eq,
+    backfill_lexical_index, collection_version,
+)
+from rag.manifest import get_manifest
+from rag.result_cache import ResultCache
+from rag.singleflight import SingleFlight
+from rag.filters import build_where, date_metadata, text_metadata
+from core.settings import settings
+from rag.lexical_index import get_lexical_index
+from rag.stages import StageTimer
+from rag.rerank import vector_scores, tfidf_scores, fuzzy_scores, domain_boosts, max_domain_boost, mmr
 from datetime import datetime
-import csv, os, hashlib, re, numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from bisect import bisect_right
+from itertools import islice
+import asyncio, csv, functools, os, hashlib, re, threading, numpy as np
 
 MIN_FUZZ = 50
 
+_RESULTS = ResultCache(settings.RESULT_CACHE_MAX_ITEMS)
+# identical concurrent misses share one retrieval; callers get their own copies
+_FLIGHT = SingleFlight(ResultCache._copy)
+_EXECUTOR = ThreadPoolExecutor(max_workers=max(1, settings.RETRIEVAL_WORKERS), thread_name_prefix="retrieve")
+# one Chroma write in flight per ingest stream, overlapping the next batch's embedding
+_WRITER = ThreadPoolExecutor(max_workers=max(1, settings.INGEST_WORKERS), thread_name_prefix="ingest-write")
+
 # ---------- Helpers ----------
 def _sha1(s: str) -> str:
     return hashlib.sha1(s.encode("utf-8", errors="ignore")).hexdigest()
@@ -49,223 +70,443 @@ def _label_prefix(meta: Dict[str, Any]) -> str:
     name = meta.get("file_name") or meta.get("csv_file") or ""
     return f"[{src} - {name}] "
 
-def _cos(a, b):
-    a = np.array(a); b = np.array(b)
-    na = np.linalg.norm(a); nb = np.linalg.norm(b)
-    return float(a @ b) / (na * nb + 1e-9)
-
-def _tok(s: str) -> List[str]:
-    return re.findall(r"[a-z0-9]+", (s or "").lower())
-
-def _tfidf_scores(query: str, docs: List[str]) -> List[float]:
-    # tiny TF-IDF cosine for rerank (no sklearn dep)
-    from collections import Counter
-    qtok = _tok(query)
-    d_toks = [_tok(d) for d in docs]
-    df = Counter()
-    for toks in d_toks:
-        for w in set(toks):
-            df[w] += 1
-    N = max(1, len(docs))
-
-    keys = list(set(qtok) | set().union(*[set(t) for t in d_toks]))
-    idx = {w: i for i, w in enumerate(keys)}
-
-    def vec_from(toks):
-        c = Counter(toks)
-        v = np.zeros(len(keys))
-        denom = max(1, len(toks))
-        for w, ct in c.items():
-            idf = np.log((N + 1) / (1 + df[w])) + 1.0
-            v[idx[w]] = (ct / denom) * idf
-        return v
-
-    qv = vec_from(qtok); qn = np.linalg.norm(qv) + 1e-9
-    dvs = [vec_from(t) for t in d_toks]
-    return [float(qv @ dv) / (qn * (np.linalg.norm(dv) + 1e-9)) for dv in dvs]
-
-def _mmr(candidates: List[int], qvec, emb_list: List[List[float]], k=5, lam=0.65):
-    chosen = []
-    cand = set(candidates)
-    while cand and len(chosen) < k:
-        best, best_i = -1e9, None
-        for i in list(cand):
-            sim_q = _cos(qvec, emb_list[i])
-            div = 0.0 if not chosen else max(_cos(emb_list[i], emb_list[j]) for j in chosen)
-            score = lam * sim_q - (1 - lam) * div
-            if score > best:
-                best, best_i = score, i
-        chosen.append(best_i)
-        cand.remove(best_i)
-    return chosen
+def _chunk_ids(prefix: str, doc_key: str, docs: Sequence[str], seen: Callable[[List[str]], Dict[str, int]]) -> List[str]:
+    """
+    Content-hash ids scoped to the document; repeats of the same text get
+    :2, :3, ... `seen(bases)` says how many of each base id came before.
+    """
+    scope = _sha1(doc_key)[:12]
+    bases = [f"{prefix}:{scope}:{_sha1(d)[:16]}" for d in docs]
+    counts = seen(list(dict.fromkeys(bases)))
+    out = []
+    for b in bases:
+        counts[b] = counts.get(b, 0) + 1
+        out.append(b + (f":{counts[b]}" if counts[b] > 1 else ""))
+    return out
+
+# progress(stage, fraction of the document read so far), called from the ingesting thread
+ProgressFn = Callable[[str, float], None]
+
+class _Progress:
+    """Input readers move `done` forward; it is reported once each batch is stored."""
+
+    def __init__(self, fn: Optional[ProgressFn] = None):
+        self.fn = fn
+        self.done = 0.0
+
+    def read(self, done: float) -> None:
+        self.done = max(self.done, min(1.0, done))
+
+    def report(self, stage: str) -> None:
+        if self.fn:
+            self.fn(stage, self.done)
+
+def _tracked(pieces: Iterable[Any], prog: _Progress, total: float,
+             weigh: Callable[[Any], float] = lambda _: 1) -> Iterator[Any]:
+    """Pass `pieces` through, recording the share of `total` consumed."""
+    n = 0.0
+    for p in pieces:
+        n += weigh(p)
+        if total:
+            prog.read(n / total)
+        yield p
+
+# ---------- Per-document ingest lock ----------
+_DOC_LOCKS: Dict[str, List[Any]] = {}   # doc_key -> [RLock, holders + waiters]
+_DOC_LOCKS_GUARD = threading.Lock()
+
+@contextmanager
+def ingest_lock(doc_key: str, on_wait: Optional[Callable[[], None]] = None):
+    """
+    Serialise ingests of one document (in this process); re-entrant.
+    `on_wait` is called if another run holds it and we have to block.
+    """
+    with _DOC_LOCKS_GUARD:
+        entry = _DOC_LOCKS.setdefault(doc_key, [threading.RLock(), 0])
+        entry[1] += 1
+    try:
+        if not entry[0].acquire(blocking=False):
+            if on_wait:
+                on_wait()
+            entry[0].acquire()
+        try:
+            yield
+        finally:
+            entry[0].release()
+    finally:
+        with _DOC_LOCKS_GUARD:
+            entry[1] -= 1
+            if not entry[1]:
+                _DOC_LOCKS.pop(doc_key, None)
+
+class _Resume:
+    """
+    Checkpoint handle for a resumable reader (see ingest_csv_file). The
+    reader sets `pos` before yielding each item: its position just past
+    the record the item belongs to when that item is the record's last,
+    else None. _ingest_stream ends batches on records and, once a batch is
+    stored, checkpoints `pos` with the batch's manifest marks. A later run over
+    the same file (same fingerprint) picks up the generation and `start`s
+    the reader there.
+
+    The checkpoint is read by load(), which _ingest_stream calls once it
+    holds the document's ingest lock; `start` is only valid after that.
+    """
+
+    def __init__(self, doc_key: str, fingerprint: str):
+        self.doc_key, self.fingerprint = doc_key, fingerprint
+        self.gen: Optional[int] = None
+        self.start: Optional[Dict[str, Any]] = None
+        self.pos: Optional[Dict[str, Any]] = None
+
+    def load(self) -> None:
+        man = get_manifest()
+        cp = man.checkpoint(self.doc_key)
+        fresh = cp is None or cp["fingerprint"] != self.fingerprint
+        self.gen = man.new_gen() if fresh else cp["gen"]
+        self.start = None if fresh else cp["position"]
+        if self.start:
+            print(f"[ingest] {self.doc_key}: resuming at {self.start}")
+
+    def done(self) -> None:
+        get_manifest().clear_checkpoint(self.doc_key)
+
+def _ingest_stream(
+    col,
+    doc_key: str,
+    prefix: str,
+    items: Iterable[Tuple[str, Dict[str, Any]]],
+    replace: bool = True,
+    progress: Optional[_Progress] = None,
+    resume: Optional[_Resume] = None,
+    timer: Optional[StageTimer] = None,
+) -> int:
+    """
+    Incremental ingest of one document. `items` lazily yields (stored text,
+    metadata); chunk ids are content hashes, so against the document's
+    manifest a re-ingest embeds + upserts only new chunks, refreshes metadata
+    on unchanged ones and (when `replace`) deletes the ones that are gone.
+    Returns the document's chunk count.
+
+    Batches of INGEST_BATCH_SIZE are pipelined: batch N is written to
+    Chroma on a writer thread while batch N+1 is read and embedded. Memory
+    is flat in document size; which ids this run produced is tracked in
+    the manifest under the run's generation, not in a set.
+
+    Timer stages: chunk (producing items, minus the reader's own stages),
+    diff, embed, upsert (writer thread, overlaps the others), write_wait
+    and cleanup.
+    """
+    # one run per document at a time: concurrent runs would sweep each other's chunks as stale
+    with ingest_lock(doc_key):
+        progress = progress or _Progress()
+        timer = timer or StageTimer()
+        man = get_manifest()
+        if resume:
+            resume.load()
+        gen = resume.gen if resume else man.new_gen()
+        provisional = -man.new_gen()   # marks of the batch being written, this process run only
+        added = kept = 0
+        it, size = timer.iter("chunk", items), max(1, settings.INGEST_BATCH_SIZE)
+        pending = None   # (future, reader position) of the write in flight
+
+        def write(ids, batch, fresh, same, vecs):
+            with timer.stage("upsert"):
+                if fresh:
+                    upsert_chunks(col, ids=[ids[j] for j in fresh], documents=[batch[j][0] for j in fresh],
+                                  embeddings=vecs, metadatas=[batch[j][1] for j in fresh])
+                if same:
+                    update_metadatas(col, [ids[j] for j in same], [batch[j][1] for j in same])
+
+        def settle():
+            fut, pos = pending
+            with timer.stage("write_wait"):
+                fut.result()
+                cp = (resume.fingerprint, pos) if resume and pos is not None else None
+                man.promote(doc_key, provisional, gen, cp)
+            progress.report("indexing")
+
+        try:
+            while True:
+                batch = list(islice(it, size))
+                if resume:
+                    # finish the record, so the checkpoint never lands inside one
+                    while batch and resume.pos is None:
+                        nxt = next(it, None)
+                        if nxt is None:
+                            break
+                        batch.append(nxt)
+                if not batch:
+                    break
+                pos = resume.pos if resume else None
+                with timer.stage("diff"):
+                    ids = _chunk_ids(prefix, doc_key, [d for d, _ in batch],
+                                     lambda bases: man.repeats(doc_key, (gen, provisional), bases))
+                    known = list(man.known(doc_key, ids))
+                    # trust the manifest only for ids Chroma still has
+                    present = set(col.get(ids=known, include=[]).get("ids") or []) if known else set()
+                    fresh = [j for j, i in enumerate(ids) if i not in present]
+                    same = [j for j, i in enumerate(ids) if i in present]
+                with timer.stage("embed"):
+                    vecs = embed_texts([batch[j][0] for j in fresh], timer=timer) if fresh else []
+                if pending:
+                    settle()
+                man.mark(doc_key, ids, provisional)
+                pending = (_WRITER.submit(write, ids, batch, fresh, same, vecs), pos)
+                added, kept = added + len(fresh), kept + len(same)
+                timer.count(batches=1)
+            if pending:
+                settle()
+        finally:
+            if pending:
+                pending[0].exception()   # never leave a write running behind an error
+
+        removed = 0
+        if replace:
+            while True:
+                gone = man.stale(doc_key, gen)
+                if not gone:
+                    break
+                if not removed:
+                    progress.report("cleanup")
+                with timer.stage("cleanup"):
+                    delete_chunks(col, gone)
+                    man.discard(doc_key, gone)
+                removed += len(gone)
+        if resume:
+            resume.done()
+        timer.count(chunks=added + kept, chunks_new=added, chunks_unchanged=kept, chunks_removed=removed)
+        print(f"[ingest] {doc_key}: {added} new, {kept} unchanged, {removed} removed")
+        return man.count(doc_key, gen)
+
+def _delete_legacy(col, doc_key: str, path: Path, sources: Sequence[str], file_fp: str) -> None:
+    """
+    Pre-manifest cleanup: chunks of this exact file stored under positional
+    ids. Only documents keyed by their path predate the manifest; under any
+    other key the same bytes may belong to another document.
+    """
+    if doc_key != str(path) or get_manifest().has(doc_key):
+        return
+    try:
+        for src in sources:
+            delete_where(col, where_eq(source=src, file_fingerprint=file_fp))
+    except Exception:
+        pass
 
 
 
 # ---------- TXT ingestion ----------
-def ingest_txt_file(path: Path, delete_previous_for_same_file: bool = False) -> int:
+def ingest_txt_file(path: Path, delete_previous_for_same_file: bool = False, doc_key: Optional[str] = None,
+                    progress: Optional[ProgressFn] = None, display_name: Optional[str] = None,
+                    timer: Optional[StageTimer] = None) -> int:
     col = get_collection()
     if not path.exists():
         return 0
-    try:
-        text = path.read_text(encoding="utf-8", errors="ignore")
-    except Exception:
-        text = path.read_text(encoding="latin-1", errors="ignore")
-    if not (text or "").strip():
-        return 0
 
+    doc_key = doc_key or str(path)
     file_fp = _file_fingerprint(path)
     if delete_previous_for_same_file:
-        try:
-            col.delete(where={"source": "txt", "file_fingerprint": file_fp})
-        except Exception:
-            pass
+        _delete_legacy(col, doc_key, path, ["txt"], file_fp)
 
-    chunks = chunk_text(text)
-    ids = [f"txt::{file_fp}::{i}" for i, _ in enumerate(chunks)]
-    metas = [{
+    meta = {
         "source": "txt",
-        "file_name": path.name,
+        "file_name": display_name or path.name,
         "path": str(path),
         "file_fingerprint": file_fp,
-    } for _ in chunks]
-    vecs = embed_texts(chunks)
-    col.upsert(documents=chunks, embeddings=vecs, metadatas=metas, ids=ids)
-    return len(ids)
+    }
+    # mmap'd, decoded block by block: the file is never one big string
+    prog = _Progress(progress)
+    timer = timer or StageTimer()
+    size = path.stat().st_size
+    timer.count(bytes=size)
+    blocks = _tracked(timer.iter("extract", iter_file_text(path)), prog, size, weigh=len)
+    items = ((ch, dict(meta)) for ch in iter_chunks(blocks))
+    return _ingest_stream(col, doc_key, "txt", items, replace=delete_previous_for_same_file,
+                          progress=prog, timer=timer)
 
 # ---------- DOCX ingestion ----------
-def ingest_docx_file(path: Path, delete_previous_for_same_file: bool = False) -> int:
+def ingest_docx_file(path: Path, delete_previous_for_same_file: bool = False, doc_key: Optional[str] = None,
+                     progress: Optional[ProgressFn] = None, display_name: Optional[str] = None,
+                     timer: Optional[StageTimer] = None) -> int:
     from docx import Document  # python-docx
     col = get_collection()
     if not path.exists():
         return 0
+    timer = timer or StageTimer()
     try:
-        doc = Document(str(path))
-        paras = [p.text for p in doc.paragraphs]
-        text = "\n\n".join([t for t in paras if t and t.strip()])
+        with timer.stage("extract"):
+            doc = Document(str(path))
     except Exception:
-        text = ""
-
-    if not (text or "").strip():
         return 0
+    timer.count(bytes=path.stat().st_size)
 
+    doc_key = doc_key or str(path)
     file_fp = _file_fingerprint(path)
     if delete_previous_for_same_file:
-        try:
-            col.delete(where={"source": "docx", "file_fingerprint": file_fp})
-        except Exception:
-            pass
+        _delete_legacy(col, doc_key, path, ["docx"], file_fp)
 
-    chunks = chunk_text(text)
-    ids = [f"docx::{file_fp}::{i}" for i, _ in enumerate(chunks)]
-    metas = [{
+    meta = {
         "source": "docx",
-        "file_name": path.name,
+        "file_name": display_name or path.name,
         "path": str(path),
         "file_fingerprint": file_fp,
-    } for _ in chunks]
-    vecs = embed_texts(chunks)
-    col.upsert(documents=chunks, embeddings=vecs, metadatas=metas, ids=ids)
-    return len(ids)
+    }
+    prog = _Progress(progress)
+    paras = (p.text + "\n\n" for p in _tracked(timer.iter("extract", doc.paragraphs), prog, len(doc.paragraphs))
+             if p.text and p.text.strip())
+    items = ((ch, dict(meta)) for ch in iter_chunks(paras))
+    return _ingest_stream(col, doc_key, "docx", items, replace=delete_previous_for_same_file,
+                          progress=prog, timer=timer)
 # ---------- PDF ingestion ----------
+def _pdf_chunks(pages: Iterable[PageText]) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """Chunks of a page stream, each with the pages it spans and how they were extracted."""
+    ends: List[int] = []                 # stream offset where each page (plus "\n") ends
+    info: List[Tuple[int, str]] = []     # (page number, method)
+
+    def pieces():
+        off = 0
+        for p in pages:
+            off += len(p.text) + 1
+            ends.append(off)
+            info.append((p.number, p.method))
+            yield p.text + "\n"
+
+    for start, end, ch in iter_chunk_spans(pieces()):
+        lo = bisect_right(ends, start)
+        hi = min(bisect_right(ends, end - 1), len(info) - 1)
+        spanned = info[lo:hi + 1]
+        methods = sorted({m for _, m in spanned})
+        yield ch, {
+            "page_start": spanned[0][0],
+            "page_end": spanned[-1][0],
+            "extraction": methods[0] if len(methods) == 1 else "mixed",
+            "page_methods": ",".join(f"{n}:{m}" for n, m in spanned),   # e.g. "4:native,5:ocr"
+            "used_ocr": "ocr" in methods,
+        }
+
 def ingest_pdf_dir(pdf_dir: Path, max_files: int = 100, delete_previous_for_same_file: bool = False) -> int:
     col = get_collection()
     paths = list(pdf_dir.glob("*.pdf"))[:max_files]
     total = 0
     for path in paths:
-        text, meta = smart_pdf_extract(path)  # meta may include source_type=pdf or pdf_ocr
-        if not (text or "").strip():
-            continue
+        pages, meta = smart_pdf_pages(path)  # per-page native/OCR; see chunk "extraction"
 
+        doc_key = str(path)
         file_fp = _file_fingerprint(path)
         if delete_previous_for_same_file:
-            try:
-                col.delete(where={"source": "pdf", "file_fingerprint": file_fp})
-                col.delete(where={"source": "pdf_ocr", "file_fingerprint": file_fp})
-            except Exception:
-                pass
-
-        docs, metas, ids = [], [], []
-        # ensure we have a clear source_type for labeling
-        source_type = meta.get("source_type") or "pdf"
-        for i, ch in enumerate(chunk_text(text)):
-            label = _label_prefix({"source_type": source_type, "file_name": path.name})
-            chunk_for_store = label + ch
-            docs.append(chunk_for_store)
-            metas.append({
-                "source": source_type,                 # keep simple: "pdf" or "pdf_ocr"
-                "source_type": source_type,
-                "file_name": path.name,
-                "file_fingerprint": file_fp,
-                "chunk": i,
-                **meta,
-                "ingested_at": datetime.utcnow().isoformat() + "Z",
-            })
-            cid = _sha1(f"pdf:{file_fp}:{source_type}:{i}:{len(ch)}")[:10]
-            ids.append(f"pdf:{file_fp}:{source_type}:c{i}:{cid}")
-
-        if docs:
-            vecs = embed_texts(docs)
-            col.upsert(documents=docs, embeddings=vecs, metadatas=metas, ids=ids)
-            total += len(ids)
+            _delete_legacy(col, doc_key, path, ["pdf", "pdf_ocr"], file_fp)
+
+        def items():
+            for i, (ch, page_meta) in enumerate(_pdf_chunks(pages)):
+                # source_type labels the chunk: "pdf" or "pdf_ocr" when any page was OCR'd
+                source_type = "pdf_ocr" if page_meta["used_ocr"] else "pdf"
+                label = _label_prefix({"source_type": source_type, "file_name": path.name})
+                yield label + ch, {
+                    "source": "pdf",
+                    "source_type": source_type,
+                    "file_name": path.name,
+                    "file_fingerprint": file_fp,
+                    "chunk": i,
+                    **meta,
+                    **page_meta,
+                    "ingested_at": datetime.utcnow().isoformat() + "Z",
+                }
+        total += _ingest_stream(col, doc_key, "pdf", items(), replace=delete_previous_for_same_file)
     return total
 
-def ingest_pdf_file(path: Path, delete_previous_for_same_file: bool = False) -> int:
+def ingest_pdf_file(path: Path, delete_previous_for_same_file: bool = False, doc_key: Optional[str] = None,
+                    progress: Optional[ProgressFn] = None, display_name: Optional[str] = None,
+                    timer: Optional[StageTimer] = None) -> int:
     """
     Ingest a single PDF file (mirror of ingest_pdf_dir loop body).
-    Returns number of chunks added.
+    Returns the number of chunks the document now has.
     """
     col = get_collection()
     if not path.exists():
         return 0
 
-    text, meta = smart_pdf_extract(path)  # meta may include source='pdf' or 'pdf_ocr'
-    if not (text or "").strip():
-        return 0
+    timer = timer or StageTimer()
+    timer.count(bytes=path.stat().st_size)
+    pages, meta = smart_pdf_pages(path, timer=timer)  # per-page native/OCR; see chunk "extraction"
+    prog = _Progress(progress)
+    prog.report("extracting")
+    pages = _tracked(pages, prog, meta["page_count"])
 
     # same fingerprinting/cleanup used in ingest_pdf_dir
+    doc_key = doc_key or str(path)
     file_fp = _file_fingerprint(path)
     if delete_previous_for_same_file:
-        try:
-            col.delete(where={"source": "pdf", "file_fingerprint": file_fp})
-            col.delete(where={"source": "pdf_ocr", "file_fingerprint": file_fp})
-        except Exception:
-            pass
-
-    chunks = chunk_text(text)
-    ids = [f"pdf::{file_fp}::{i}" for i, _ in enumerate(chunks)]
-    metas = []
-    for i, ch in enumerate(chunks):
-        m: Dict[str, Any] = {
-            "source": meta.get("source", "pdf"),  # e.g., "pdf" or "pdf_ocr"
-            "file_name": path.name,
-            "path": str(path),
-            "file_fingerprint": file_fp,
-            "chunk": i,
-            "chunk_char_count": len(ch),
-            "ingested_at": datetime.utcnow().isoformat() + "Z",
-        }
-        metas.append(m)
+        _delete_legacy(col, doc_key, path, ["pdf", "pdf_ocr"], file_fp)
 
-    vecs = embed_texts(chunks)
-    col.upsert(documents=chunks, embeddings=vecs, metadatas=metas, ids=ids)
-    return len(ids)
+    # pages -> chunks -> embed/upsert batches, all lazily
+    items = ((ch, {
+        "source": "pdf",
+        "source_type": "pdf_ocr" if page_meta["used_ocr"] else "pdf",
+        "file_name": display_name or path.name,
+        "path": str(path),
+        "file_fingerprint": file_fp,
+        "chunk": i,
+        "chunk_char_count": len(ch),
+        **page_meta,
+        "ingested_at": datetime.utcnow().isoformat() + "Z",
+    }) for i, (ch, page_meta) in enumerate(_pdf_chunks(pages)))
+    return _ingest_stream(col, doc_key, "pdf", items, replace=delete_previous_for_same_file,
+                          progress=prog, timer=timer)
 
 
 # ---------- CSV ingestion ----------
-def ingest_csv_file(csv_path: Path, delete_previous_for_same_file: bool = True) -> int:
+def _csv_records(raw: BinaryIO, start: Optional[Dict[str, int]] = None, encoding: str = "utf-8",
+                 **fmt: Any) -> Iterator[Tuple[int, Dict[str, Any], Dict[str, int]]]:
+    """
+    csv.DictReader over a binary file that also yields the exact byte offset
+    just past each record (quoted newlines included): (row number, row,
+    {"offset", "row"}). Pass such a position back as `start` to resume
+    there; the header is always read from the top.
     """
-    - Unique, deterministic IDs per row+chunk.
+    offset = 0
+
+    def lines():
+        nonlocal offset
+        # csv pulls one line at a time, so after each record `offset` is its end
+        for line in iter(raw.readline, b""):
+            offset += len(line)
+            yield line.decode(encoding)
+
+    src = lines()
+    header = next(csv.reader(src, **fmt), None)
+    if not header:
+        return
+    row_idx = 0
+    if start:
+        raw.seek(start["offset"])
+        offset, row_idx = start["offset"], start["row"]
+    for values in csv.reader(src, **fmt):
+        if not values:
+            continue   # DictReader skips blank lines too
+        row_idx += 1
+        row: Dict[str, Any] = dict(zip(header, values))
+        for k in header[len(values):]:
+            row[k] = None
+        if len(values) > len(header):
+            row[None] = values[len(header):]
+        yield row_idx, row, {"offset": offset, "row": row_idx}
+
+def ingest_csv_file(csv_path: Path, delete_previous_for_same_file: bool = True, doc_key: Optional[str] = None,
+                    progress: Optional[ProgressFn] = None, display_name: Optional[str] = None,
+                    timer: Optional[StageTimer] = None) -> int:
+    """
+    - Content-hash IDs per row chunk, diffed against the file's manifest on re-ingest.
     - Accepts both your CSV (title/body/description/content) and 'summary' (demo CSV).
     - Stores file_fingerprint; prefixes chunks with a label to help lexical retrieval.
+    - Streams rows in batches and checkpoints after each stored batch; an
+      interrupted import of the same file resumes where it stopped.
     """
     col = get_collection()
+    doc_key = doc_key or str(csv_path)
     file_fp = _file_fingerprint(csv_path)
 
     if delete_previous_for_same_file:
-        try:
-            col.delete(where={"source": "csv", "file_fingerprint": file_fp})
-        except Exception:
-            pass
+        _delete_legacy(col, doc_key, csv_path, ["csv"], file_fp)
 
     text_fields = ("title", "body", "description", "content", "summary")
     metadata_fields = (
@@ -274,52 +515,54 @@ def ingest_csv_file(csv_path: Path, delete_previous_for_same_file: bool = True)
         "effective_date", "last_updated", "source_url", "section", "keywords",
     )
 
-    docs: List[str] = []
-    metas: List[Dict[str, Any]] = []
-    ids: List[str] = []
-
-    with open(csv_path, newline='', encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row_idx, row in enumerate(reader, start=1):
-            body = _assemble_text(row, text_fields).strip()
-            if not body:
-                continue
-
-            chunks = list(chunk_text(body))
-            if not chunks:
-                continue
-
-            row_key = _safe_row_key(row, fallback=f"row-{row_idx}")
-
-            base_meta: Dict[str, Any] = {
-                "source": "csv",
-                "source_type": "csv",
-                "csv_file": csv_path.name,
-                "file_fingerprint": file_fp,
-                "row_index": row_idx,
-                "ingested_at": datetime.utcnow().isoformat() + "Z",
-            }
-            for mf in metadata_fields:
-                if mf in row and row[mf] is not None and str(row[mf]).strip():
-                    base_meta[mf] = str(row[mf]).strip()
-
-            for c_idx, ch in enumerate(chunks):
-                label = _label_prefix(base_meta)
-                chunk_for_store = label + ch
-                docs.append(chunk_for_store)
-                m = dict(base_meta)
-                m["chunk"] = c_idx
-                m["chunk_char_count"] = len(ch)
-                metas.append(m)
-                h = _sha1(f"csv:{file_fp}:{row_key}:{c_idx}:{len(ch)}")[:10]
-                ids.append(f"csv:{file_fp}:{row_key}:c{c_idx}:{h}")
-
-    if not docs:
-        return 0
-
-    vecs = embed_texts(docs)
-    col.upsert(documents=docs, embeddings=vecs, metadatas=metas, ids=ids)
-    return len(ids)
+    prog = _Progress(progress)
+    size = csv_path.stat().st_size
+    resume = _Resume(doc_key, file_fp)
+    timer = timer or StageTimer()
+
+    def rows():
+        # runs inside _ingest_stream, after resume.load()
+        timer.count(bytes=size - (resume.start or {}).get("offset", 0))
+        with open(csv_path, "rb") as raw:
+            for row_idx, row, pos in timer.iter("extract", _csv_records(raw, start=resume.start)):
+                timer.count(rows=1)
+                if size:
+                    prog.read(pos["offset"] / size)
+                body = _assemble_text(row, text_fields).strip()
+                if not body:
+                    continue
+
+                chunks = list(chunk_text(body))
+                if not chunks:
+                    continue
+
+                base_meta: Dict[str, Any] = {
+                    "source": "csv",
+                    "source_type": "csv",
+                    "csv_file": display_name or csv_path.name,
+                    "file_fingerprint": file_fp,
+                    "row_index": row_idx,
+                    "row_key": _safe_row_key(row, fallback=f"row-{row_idx}"),
+                    "ingested_at": datetime.utcnow().isoformat() + "Z",
+                }
+                for mf in metadata_fields:
+                    if mf in row and row[mf] is not None and str(row[mf]).strip():
+                        base_meta[mf] = str(row[mf]).strip()
+                # epoch shadows of effective_date / last_updated for range filters,
+                # lowercase shadows of jurisdiction / risk_level / ... for equality
+                base_meta.update(date_metadata(base_meta))
+                base_meta.update(text_metadata(base_meta))
+
+                for c_idx, ch in enumerate(chunks):
+                    label = _label_prefix(base_meta)
+                    m = dict(base_meta)
+                    m["chunk"] = c_idx
+                    m["chunk_char_count"] = len(ch)
+                    resume.pos = pos if c_idx == len(chunks) - 1 else None
+                    yield label + ch, m
+
+    return _ingest_stream(col, doc_key, "csv", rows(), replace=delete_previous_for_same_file,
+                          progress=prog, resume=resume, timer=timer)
 
 # ---------- Retrieval ----------
 def _expand_query(q: str) -> List[str]:
@@ -350,63 +593,289 @@ def _expand_query(q: str) -> List[str]:
             out.append(t); seen.add(t)
     return out[:3]
 
-def retrieve_topk(query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+# Rerank weights; the cascade's score bounds below depend on them
+W_VEC, W_TFIDF, W_FUZZY = 0.55, 0.25, 0.20
+
+def _hybrid_scores(q: str, base_qvec, docs, metas, embs, timer: StageTimer) -> np.ndarray:
+    # Scores: vector (vs base query), tf-idf, fuzzy -- each one batched over the pool
+    with timer.stage("vector"):
+        vec_scores  = vector_scores(base_qvec, embs)
+    with timer.stage("tfidf"):
+        tfidf_sc    = tfidf_scores(q, docs)
+    with timer.stage("fuzzy"):
+        fuzzy_sc    = fuzzy_scores(q, docs)
+
+    # Domain-aware tiny boosts to help OCR/metadata hits
+    boosts = domain_boosts(q, metas)
+
+    return W_VEC * vec_scores + W_TFIDF * tfidf_sc + W_FUZZY * fuzzy_sc + boosts
+
+def _field(res: Dict[str, Any], key: str):
+    # Chroma may return embeddings as numpy arrays: no truthiness tests
+    v = res.get(key)
+    return [] if v is None else v
+
+_LEXICAL_CHECKED = False
+
+def _bm25_candidates(col, q: str, n: int) -> List[tuple]:
+    """BM25 top-n over the persistent index; backfills it once for pre-existing collections."""
+    global _LEXICAL_CHECKED
+    idx = get_lexical_index()
+    if not _LEXICAL_CHECKED:
+        _LEXICAL_CHECKED = True
+        try:
+            if idx.count() == 0 and col.count() > 0:
+                backfill_lexical_index(col)
+        except Exception as e:
+            print(f"[retriever] BM25 backfill failed: {e}")
+    try:
+        return idx.search(q, n=n)
+    except Exception as e:
+        print(f"[retriever] BM25 search failed: {e}")
+        return []
+
+def retrieval_cache_stats() -> Dict[str, float]:
+    return {**_RESULTS.stats(), "coalesced": _FLIGHT.stats()}
+
+def _cache_key(query: str, top_k: int, mmr_lambda, mmr_pool, filters, cascade) -> tuple:
+    q = re.sub(r"\s+", " ", (query or "").strip())
+    lam = mmr_lambda if np.isscalar(mmr_lambda) else list(mmr_lambda)
+    where = build_where(filters)
+    # keyed on exactly the text retrieval runs on: embeddings and fuzzy scores are case-sensitive
+    return q, where, ResultCache.make_key(q, top_k, lam, mmr_pool, where, cascade)
+
+def retrieve_topk(
+    query: str,
+    top_k: int = 5,
+    mmr_lambda: Union[float, Sequence[float]] = 0.65,
+    mmr_pool: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    cascade: Optional[bool] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Cached front for _retrieve_topk (or _retrieve_cascade when `cascade`,
+    default settings.RETRIEVAL_CASCADE). Entries are keyed by the normalised query
+    and every retrieval parameter, and are only served while the collection
+    version (bumped on each upsert/delete) is unchanged.
+    """
+    cascade = settings.RETRIEVAL_CASCADE if cascade is None else bool(cascade)
+    q, where, key = _cache_key(query, top_k, mmr_lambda, mmr_pool, filters, cascade)
+    run = _retrieve_cascade if cascade else _retrieve_topk
+    # read the version *before* computing: a write that lands mid-query then
+    # leaves this entry already stale instead of caching pre-write results
+    version = collection_version()
+    hit = _RESULTS.get(key, version)
+    if hit is not None:
+        return hit
+    return _FLIGHT.do((key, version), functools.partial(_compute, run, q, key, version, top_k, mmr_lambda, mmr_pool, where))
+
+async def aretrieve_topk(
+    query: str,
+    top_k: int = 5,
+    mmr_lambda: Union[float, Sequence[float]] = 0.65,
+    mmr_pool: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    cascade: Optional[bool] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Async retrieve_topk for async endpoints. Cache hits return inline; misses
+    run the blocking embed / Chroma / rerank work on a dedicated bounded
+    executor, so retrieval neither blocks the event loop nor starves
+    FastAPI's shared threadpool.
+    """
+    cascade = settings.RETRIEVAL_CASCADE if cascade is None else bool(cascade)
+    q, where, key = _cache_key(query, top_k, mmr_lambda, mmr_pool, filters, cascade)
+    run = _retrieve_cascade if cascade else _retrieve_topk
+    version = collection_version()
+    hit = _RESULTS.get(key, version)
+    if hit is not None:
+        return hit
+    loop = asyncio.get_running_loop()
+    compute = functools.partial(_compute, run, q, key, version, top_k, mmr_lambda, mmr_pool, where)
+    # waiters on the loop hold no executor thread; the one run that does goes
+    # through the same flight as sync callers
+    return await _FLIGHT.ado(
+        (key, version),
+        lambda: loop.run_in_executor(_EXECUTOR, _FLIGHT.do, (key, version), compute),
+    )
+
+def _compute(run, q: str, key: str, version: str, top_k, mmr_lambda, mmr_pool, where) -> List[Dict[str, Any]]:
+    results = run(q, top_k=top_k, mmr_lambda=mmr_lambda, mmr_pool=mmr_pool, where=where)
+    _RESULTS.put(key, version, results)
+    return results
+
+def _retrieve_topk(
+    query: str,
+    top_k: int = 5,
+    mmr_lambda: Union[float, Sequence[float]] = 0.65,
+    mmr_pool: Optional[int] = None,
+    where: Optional[Dict[str, Any]] = None,
+    timer: Optional[StageTimer] = None,
+) -> List[Dict[str, Any]]:
     """
     Hybrid retrieval:
-      - Build a big candidate pool from multiple query variants (vectors).
+      - Build a big candidate pool from multiple query variants (vectors),
+        unioned with BM25 top-N from the persistent lexical index.
       - Rerank using vector sim + TF-IDF + fuzzy, with small domain boosts.
-      - Apply MMR for diversity.
+      - Apply MMR for diversity over the best `mmr_pool` (default max(5k, 30))
+        reranked hits; `mmr_lambda` is a float or a per-pick schedule.
+    `where` (see rag.filters.build_where) is pushed into every Chroma call,
+    so filtered-out chunks never reach the ANN result or the rerank stage.
+    Pass a StageTimer to get per-stage wall/CPU time (used by the benchmarks).
     """
+    timer = timer or StageTimer()
     col = get_collection()
     q = re.sub(r"\s+", " ", (query or "").strip())
     variants = _expand_query(q)
-    qvecs = embed_texts(variants)
+    with timer.stage("embed"):
+        qvecs = embed_texts(variants)
 
     pool = max(top_k * 6, 30)
     agg_docs, agg_metas, agg_ids, agg_embs = [], [], [], []
     seen = set()
 
-    for vvec in qvecs:
+    # One Chroma round trip for every variant; results come back per query,
+    # merged in variant order so the first (base) query wins ties
+    with timer.stage("chroma_query"):
         res = col.query(
-            query_embeddings=[vvec],
+            query_embeddings=qvecs,
             n_results=pool,
-            include=["embeddings", "documents", "metadatas"]  # ✅
+            include=["embeddings", "documents", "metadatas"],  # ✅
+            **({"where": where} if where else {}),
         )
-        docs = res.get("documents", [[]])[0]
-        metas = res.get("metadatas", [[]])[0]
-        ids = res.get("ids", [[]])[0]
-        embs = res.get("embeddings", [[]])[0]
+    per_variant = zip(res.get("documents") or [], res.get("metadatas") or [],
+                      res.get("ids") or [], _field(res, "embeddings"))
+    for docs, metas, ids, embs in per_variant:
         for d, m, i, e in zip(docs, metas, ids, embs):
             if i in seen:
                 continue
             seen.add(i)
             agg_docs.append(d); agg_metas.append(m); agg_ids.append(i); agg_embs.append(e)
 
+    # Lexical candidates (BM25 over the whole collection): exact-term hits such as
+    # regulation codes or record ids that the vector pool missed
+    with timer.stage("bm25"):
+        extra = [i for i, _ in _bm25_candidates(col, q, pool) if i not in seen]
+    if extra:
+        with timer.stage("chroma_get"):
+            res = col.get(ids=extra, include=["embeddings", "documents", "metadatas"],
+                          **({"where": where} if where else {}))
+        for d, m, i, e in zip(res.get("documents") or [], res.get("metadatas") or [],
+                              res.get("ids") or [], _field(res, "embeddings")):
+            seen.add(i)
+            agg_docs.append(d); agg_metas.append(m); agg_ids.append(i); agg_embs.append(e)
+
     if not agg_docs:
         return []
 
-    # Scores: vector (vs base query), tf-idf, fuzzy
+    timer.count(candidates=len(agg_docs))
     base_qvec = qvecs[0]
-    vec_scores  = np.array([_cos(base_qvec, e) for e in agg_embs])
-    tfidf_sc    = np.array(_tfidf_scores(q, agg_docs))
-    fuzzy_sc    = np.array([fuzz.token_set_ratio(q, d) / 100.0 for d in agg_docs])
-
-    # Domain-aware tiny boosts to help OCR/metadata hits
-    boosts = np.zeros(len(agg_docs))
-    low = q.lower()
-    for i, m in enumerate(agg_metas):
-        st = (m.get("source_type") or m.get("source") or "").lower()
-        if "ocr" in st:
-            boosts[i] += 0.04            # ensure OCR chunks aren’t drowned out
-        if "singapore" in low and str(m.get("jurisdiction","")).lower() == "singapore":
-            boosts[i] += 0.05
-        if "risk" in low and str(m.get("risk_level","")).lower() == "high":
-            boosts[i] += 0.05
-
-    score = 0.55 * vec_scores + 0.25 * tfidf_sc + 0.20 * fuzzy_sc + boosts
+    score = _hybrid_scores(q, base_qvec, agg_docs, agg_metas, agg_embs, timer)
 
     # Take topN and diversify
-    topN = np.argsort(-score)[:max(5 * top_k, 30)].tolist()
-    chosen = _mmr(topN, base_qvec, agg_embs, k=top_k, lam=0.65)
+    with timer.stage("mmr"):
+        topN = np.argsort(-score)[:mmr_pool or max(5 * top_k, 30)].tolist()
+        chosen = mmr(topN, base_qvec, agg_embs, k=top_k, lam=mmr_lambda)
 
     return [{"id": agg_ids[i], "text": agg_docs[i], "meta": agg_metas[i], "score": float(score[i])} for i in chosen]
+
+def _retrieve_cascade(
+    query: str,
+    top_k: int = 5,
+    mmr_lambda: Union[float, Sequence[float]] = 0.65,
+    mmr_pool: Optional[int] = None,
+    where: Optional[Dict[str, Any]] = None,
+    timer: Optional[StageTimer] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Cascaded variant of _retrieve_topk: same scoring formula, applied to a
+    shrinking shortlist so the common easy query does far less work.
+      1. Chroma returns ids + distances only. The pool starts small and doubles
+         only while its tail is within CASCADE_MARGIN of the shortlist cutoff.
+         Candidates whose score upper bound (vector bound + every other term at
+         its max) is below the cutoff's lower bound (vector term alone) are
+         dropped; at most 3x the shortlist survives.
+      2. One col.get for the survivors; exact vector + TF-IDF + boosts. Those
+         that can't reach the cutoff even with a perfect fuzzy score are dropped.
+      3. rapidfuzz only on what is left, then MMR.
+    Bounds use HNSW distances and a shortlist-fitted TF-IDF idf, so they are
+    approximate; results can differ slightly from the full rerank.
+    """
+    timer = timer or StageTimer()
+    col = get_collection()
+    q = re.sub(r"\s+", " ", (query or "").strip())
+    variants = _expand_query(q)
+    with timer.stage("embed"):
+        qvecs = embed_texts(variants)
+    wkw = {"where": where} if where else {}
+    max_boost = max_domain_boost(q)
+
+    need = max(2 * top_k, 10)                 # shortlist size that must be settled
+    cap = max(top_k * 6, 30)                  # never more than the full-mode pool
+    pool = cap // 2
+    while True:
+        with timer.stage("chroma_query"):
+            res = col.query(query_embeddings=qvecs, n_results=pool, include=["distances"], **wkw)
+        ids_per = res.get("ids") or [[]]
+        base_sims = 1.0 - np.asarray(_field(res, "distances")[0] if ids_per[0] else [], dtype=np.float64)
+        full = len(ids_per[0]) >= pool
+        ambiguous = len(base_sims) <= need or base_sims[need - 1] - base_sims[-1] < settings.CASCADE_MARGIN
+        if not (full and ambiguous and pool < cap):
+            break
+        pool = min(pool * 2, cap)
+    timer.count(pool=pool)
+
+    # ---- stage 1: bounds from distances + BM25 postings ----
+    # anything outside the base pool is no closer to the base query than its tail
+    tail = float(base_sims[-1]) if full and len(base_sims) else -1.0
+    v_ub: Dict[str, float] = dict(zip(ids_per[0], base_sims.tolist()))
+    for ids in ids_per[1:]:
+        for i in ids:
+            v_ub.setdefault(i, tail)
+    with timer.stage("bm25"):
+        bm25_ids = [i for i, _ in _bm25_candidates(col, q, need)]
+        lexical = get_lexical_index().matching(q, list(v_ub)) | set(bm25_ids)
+    for i in bm25_ids:
+        v_ub.setdefault(i, tail)
+    if not v_ub:
+        return []
+
+    ub = {i: W_VEC * v + W_TFIDF * (i in lexical) + W_FUZZY + max_boost for i, v in v_ub.items()}
+    lb = np.sort(W_VEC * base_sims)[::-1]
+    cutoff = float(lb[need - 1]) if len(lb) >= need else -np.inf
+    # BM25's own top hits always go through: exact-term matches are the ones the
+    # vector bound is worst at predicting
+    stage1 = list(dict.fromkeys(
+        bm25_ids + sorted((i for i in ub if ub[i] >= cutoff), key=ub.get, reverse=True)[:3 * need]
+    ))
+    timer.count(candidates=len(v_ub), stage1=len(stage1))
+
+    # ---- stage 2: exact vector + TF-IDF + boosts on the shortlist ----
+    with timer.stage("chroma_get"):
+        got = col.get(ids=stage1, include=["embeddings", "documents", "metadatas"], **wkw)
+    docs = list(got.get("documents") or [])
+    metas = list(got.get("metadatas") or [])
+    ids_e = list(got.get("ids") or [])
+    embs = list(_field(got, "embeddings"))
+    if not docs:
+        return []
+    with timer.stage("vector"):
+        vec_sc = vector_scores(qvecs[0], embs)
+    with timer.stage("tfidf"):
+        tfidf_sc = tfidf_scores(q, docs)
+    partial = W_VEC * vec_sc + W_TFIDF * tfidf_sc + domain_boosts(q, metas)
+    cutoff = np.partition(partial, -need)[-need] if len(partial) >= need else -np.inf
+    keep = np.flatnonzero(partial + W_FUZZY >= cutoff)
+    timer.count(stage2=len(keep))
+
+    # ---- stage 3: fuzzy on the survivors, then MMR ----
+    docs = [docs[i] for i in keep]; metas = [metas[i] for i in keep]
+    ids_e = [ids_e[i] for i in keep]; embs = [embs[i] for i in keep]
+    with timer.stage("fuzzy"):
+        score = partial[keep] + W_FUZZY * fuzzy_scores(q, docs)
+
+    with timer.stage("mmr"):
+        topN = np.argsort(-score)[:mmr_pool or max(5 * top_k, 30)].tolist()
+        chosen = mmr(topN, qvecs[0], embs, k=top_k, lam=mmr_lambda)
+
+    return [{"id": ids_e[i], "text": docs[i], "meta": metas[i], "score": float(score[i])} for i in chosen]
@@ -0,0 +1,90 @@
+# backend/rag/singleflight.py
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio, copy, threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: the first caller for a key runs
+    the function, everyone who arrives with the same key while it is in
+    flight waits for that run instead of starting their own. Nothing is
+    remembered once the call finishes (that is what the caches are for).
+
+        flight = SingleFlight()
+        hits = flight.do(("retrieve", key), lambda: _retrieve_topk(...))
+
+    Every caller, the leader included, gets its own copy of the result
+    (deepcopy by default) so no request can mutate another's. Errors are
+    re-raised in every waiter.
+    """
+
+    def __init__(self, copy_result: Callable[[Any], Any] = copy.deepcopy):
+        self._copy = copy_result
+        self._calls: Dict[Hashable, _Call] = {}
+        self._acalls: Dict[Hashable, "asyncio.Future"] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.shared += 1
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return self._copy(call.result)
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant; coalesces callers on the running event loop."""
+        key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            fut = self._acalls.get(key)
+            if fut is None:
+                fut = self._acalls[key] = asyncio.ensure_future(fn())
+                fut.add_done_callback(lambda _f, k=key: self._forget(k))
+                self.leaders += 1
+            else:
+                self.shared += 1
+        # shield: one caller being cancelled (client went away) must not
+        # cancel the run the others are waiting on
+        result = await asyncio.shield(fut)
+        return self._copy(result)
+
+    def _forget(self, key: Hashable) -> None:
+        with self._lock:
+            self._acalls.pop(key, None)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            calls = self.leaders + self.shared
+            return {
+                "in_flight": len(self._calls) + len(self._acalls),
+                "leaders": self.leaders,
+                "shared": self.shared,
+                "shared_rate": self.shared / calls if calls else 0.0,
+            }
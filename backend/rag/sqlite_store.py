@@ -0,0 +1,55 @@
+# backend/rag/sqlite_store.py
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence, TypeVar
+import sqlite3, threading
+
+T = TypeVar("T")
+
+# SQLite caps bound parameters per statement; stay well below it
+MAX_PARAMS = 500
+
+
+class SQLiteStore:
+    """
+    Base for the on-disk stores (embedding cache, BM25 index, chunk
+    manifest, OCR cache): a SQLite file in WAL mode, shared by every
+    worker, with one connection per thread (sqlite3 connections are not
+    thread-safe). Connections run in autocommit; writers that need a
+    transaction issue BEGIN / COMMIT themselves.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+
+def chunked(items: Sequence[T], size: int = MAX_PARAMS) -> Iterator[List[T]]:
+    """`items` in slices small enough to bind as one IN (...) list."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def singleton(factory: Callable[[], T]) -> Callable[[], T]:
+    """A getter that builds the instance on first call (thread-safe) and returns it ever after."""
+    instance: List[Optional[T]] = [None]
+    lock = threading.Lock()
+
+    def get() -> T:
+        with lock:
+            if instance[0] is None:
+                instance[0] = factory()
+            return instance[0]
+
+    get.__doc__ = factory.__doc__
+    return get
@@ -0,0 +1,117 @@
+# backend/rag/stages.py
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import threading, time
+
+
+class StageTimer:
+    """
+    Per-stage wall/CPU accounting for one retrieval or ingest run.
+
+        timer = StageTimer()
+        with timer.stage("embed"):
+            ...
+        timer.count(chunks=120)
+
+    CPU time is the calling thread's (time.thread_time), so work a stage
+    hands to other threads or processes shows up as wall time only.
+
+    Stages nest exclusively: while an inner stage runs, the outer one's
+    clock is paused, so a lazy pipeline (chunk pulling pages pulling OCR)
+    charges each step once. Stages may run on several threads at once.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _charge(self, name: str, wall: float, cpu: float, calls: int = 0) -> None:
+        with self._lock:
+            st = self.stages.setdefault(name, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+            st["wall_s"] += wall
+            st["cpu_s"] += cpu
+            st["calls"] += calls
+
+    @contextmanager
+    def stage(self, name: str):
+        stack: Optional[List[list]] = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        w0, c0 = time.perf_counter(), time.thread_time()
+        if stack:   # pause the enclosing stage
+            outer = stack[-1]
+            self._charge(outer[0], w0 - outer[1], c0 - outer[2])
+        frame = [name, w0, c0]
+        stack.append(frame)
+        try:
+            yield self
+        finally:
+            w1, c1 = time.perf_counter(), time.thread_time()
+            stack.pop()
+            self._charge(name, w1 - frame[1], c1 - frame[2], calls=1)
+            if stack:   # and resume it
+                stack[-1][1], stack[-1][2] = w1, c1
+
+    def iter(self, name: str, items: Iterable[Any]) -> Iterator[Any]:
+        """Pass `items` through, charging the time spent producing each one to `name`."""
+        it = iter(items)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(it)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, **counts: float) -> None:
+        with self._lock:
+            for k, v in counts.items():
+                self.counters[k] = self.counters.get(k, 0) + v
+
+    def wall(self, name: str) -> float:
+        return self.stages.get(name, {}).get("wall_s", 0.0)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "stages": {k: dict(v) for k, v in self.stages.items()},
+                "counters": dict(self.counters),
+            }
+
+
+def summarize(runs: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Totals over StageTimer.as_dict() records that also carry "wall_s" (the
+    run's end-to-end time): per-stage wall/CPU with each stage's share of
+    the total, counters, and throughput per second of end-to-end time.
+    """
+    wall = 0.0
+    stages: Dict[str, Dict[str, float]] = {}
+    counters: Dict[str, float] = {}
+    n = 0
+    for r in runs:
+        n += 1
+        wall += r.get("wall_s", 0.0)
+        for k, st in (r.get("stages") or {}).items():
+            tot = stages.setdefault(k, {"wall_s": 0.0, "cpu_s": 0.0, "calls": 0})
+            for f in tot:
+                tot[f] += st.get(f, 0)
+        for k, v in (r.get("counters") or {}).items():
+            counters[k] = counters.get(k, 0) + v
+    for st in stages.values():
+        st["share"] = st["wall_s"] / wall if wall else 0.0
+
+    def rate(key: str, scale: float = 1.0) -> float:
+        return counters.get(key, 0) / scale / wall if wall else 0.0
+
+    return {
+        "runs": n,
+        "wall_s": wall,
+        "pages_per_s": rate("pages"),
+        "chunks_per_s": rate("chunks"),
+        "mb_per_s": rate("bytes", 1 << 20),
+        "stages": stages,
+        "counters": counters,
+    }
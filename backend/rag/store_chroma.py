@@ -1,8 +1,11 @@
 # backend/rag/store_chroma.py
 from pathlib import Path
+from typing import Any, Dict, List, Sequence
+import itertools, os, threading, time
 import chromadb
 from chromadb.config import Settings
 from core.settings import settings
+from rag.lexical_index import get_lexical_index
 
 # Ensure the directory exists (even if it's a mounted volume)
 Path(settings.INDEX_DIR).mkdir(parents=True, exist_ok=True)
@@ -15,6 +18,11 @@ _client = chromadb.PersistentClient(
 
 COLLECTION = "rag_demo"
 
+# Bumped after every write so caches of query results can tell they are stale.
+# A file (not a module global) so every uvicorn worker sees every other one's writes.
+_VERSION_PATH = Path(settings.INDEX_DIR).parent / "collection.version"
+_VERSION_SEQ = itertools.count(1)
+
 def get_collection():
     """
     Always return a valid collection.
@@ -34,3 +42,93 @@ def get_collection():
             name=COLLECTION,
             metadata={"hnsw:space": "cosine"}
         )
+
+# ---------- Collection version ----------
+def collection_version() -> str:
+    try:
+        return _VERSION_PATH.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return "0"
+
+def bump_collection_version() -> str:
+    # unique token rather than read-modify-write, so two workers bumping at
+    # once can never both land on the same value
+    token = f"{time.time_ns()}-{os.getpid()}-{next(_VERSION_SEQ)}"
+    tmp = _VERSION_PATH.with_name(f"{_VERSION_PATH.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(token, encoding="utf-8")
+    os.replace(tmp, _VERSION_PATH)
+    return token
+
+# ---------- Writes (keep Chroma and the BM25 index in step) ----------
+def where_eq(**fields: Any) -> Dict[str, Any]:
+    """Equality filter on one or more metadata fields, in Chroma's where syntax."""
+    clauses = [{k: v} for k, v in fields.items() if v is not None]
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+_MAX_BATCH = 0
+
+def max_batch_size() -> int:
+    """Most records Chroma takes in one write (depends on its SQLite build)."""
+    global _MAX_BATCH
+    if not _MAX_BATCH:
+        try:
+            _MAX_BATCH = int(_client.get_max_batch_size())
+        except Exception:
+            _MAX_BATCH = int(getattr(_client, "max_batch_size", 0) or 5000)
+    return _MAX_BATCH
+
+def _slices(n: int):
+    step = max_batch_size()
+    return (slice(i, i + step) for i in range(0, n, step))
+
+def upsert_chunks(col, ids: List[str], documents: List[str], embeddings: List[List[float]],
+                  metadatas: List[Dict[str, Any]]) -> None:
+    try:
+        for sl in _slices(len(ids)):
+            col.upsert(documents=documents[sl], embeddings=embeddings[sl], metadatas=metadatas[sl], ids=ids[sl])
+            get_lexical_index().add(ids[sl], documents[sl])
+    finally:
+        bump_collection_version()
+
+def update_metadatas(col, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+    """Metadata-only update for chunks whose text (and so embedding) is unchanged."""
+    if not ids:
+        return
+    try:
+        for sl in _slices(len(ids)):
+            col.update(ids=ids[sl], metadatas=metadatas[sl])
+    finally:
+        bump_collection_version()
+
+def delete_chunks(col, ids: Sequence[str]) -> None:
+    ids = list(ids)
+    if not ids:
+        return
+    try:
+        for sl in _slices(len(ids)):
+            col.delete(ids=ids[sl])
+            get_lexical_index().remove(ids[sl])
+    finally:
+        bump_collection_version()
+
+def delete_where(col, where: Dict[str, Any]) -> int:
+    """Delete every chunk matching `where`; returns how many were removed."""
+    # include=[] avoids pulling embeddings/docs; Chroma always returns 'ids'
+    ids = col.get(where=where, include=[]).get("ids", []) or []
+    delete_chunks(col, ids)
+    return len(ids)
+
+def backfill_lexical_index(col, page: int = 1000) -> int:
+    """One-off: index chunks that were stored before the BM25 index existed."""
+    idx = get_lexical_index()
+    total, offset = col.count(), 0
+    while offset < total:
+        res = col.get(limit=page, offset=offset, include=["documents"])
+        ids = res.get("ids", []) or []
+        if not ids:
+            break
+        idx.add(ids, [d or "" for d in (res.get("documents") or [])])
+        offset += len(ids)
+    return offset
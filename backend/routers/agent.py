@@ -4,12 +4,19 @@ from pydantic import BaseModel
 from core.auth import get_current_user
 from core.models import User
 from agent.agent import run_agent
+from rag.query_utils import normalize_query
+from rag.singleflight import SingleFlight
 
 router = APIRouter(tags=["agent"])
 
+# identical questions from the same user asked at the same time share one agent run
+_FLIGHT = SingleFlight()
+
 class AgentReq(BaseModel):
     query: str
 
 @router.post("/agent-chat")
 def agent_chat(req: AgentReq, current_user: User = Depends(get_current_user)):
-    return run_agent(req.query)
+    # key on exactly what the agent is sent; its tool calls may depend on who asks
+    q = normalize_query(req.query)
+    return _FLIGHT.do(("agent", getattr(current_user, "email", None), q), lambda: run_agent(q))
@@ -1,13 +1,31 @@
-from fastapi import APIRouter, Depends
-from core.models import ChatRequest, ChatResponse
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+from typing import Any, Dict, List
+from core.models import ChatRequest, ChatResponse, ChatStreamRequest
 from core.auth import User, get_current_user
 from core.settings import settings
+from rag.filters import build_where
+from rag.llm import get_llm
+from rag.prompts import SYSTEM_PROMPT, build_prompt
+from rag.query_utils import normalize_query
+from rag.retriever import aretrieve_topk
+from rag.singleflight import SingleFlight
 import google.generativeai as genai
+import json
 
 router = APIRouter(tags=["chat"])
 
+# identical questions from the same user asked at the same time share one model call
+_FLIGHT = SingleFlight()
+
 @router.post("/chat", response_model=ChatResponse)
 def chat(req: ChatRequest, current_user: User = Depends(get_current_user)):
+    # key on exactly what the model is sent, per user: followers get the leader's answer verbatim
+    q = normalize_query(req.query)
+    return _FLIGHT.do(("chat", getattr(current_user, "email", None), q), lambda: _answer(q))
+
+def _answer(query: str) -> Dict[str, Any]:
     try:
         if not settings.GEMINI_API_KEY:
             return {"answer": "❌ Gemini API key not configured.", "citations": []}
@@ -19,7 +37,7 @@ def chat(req: ChatRequest, current_user: User = Depends(get_current_user)):
         for model_name in model_names:
             try:
                 model = genai.GenerativeModel(model_name)
-                response = model.generate_content(req.query)
+                response = model.generate_content(query)
                 
                 if response and response.text:
                     return {"answer": response.text, "citations": []}
@@ -28,8 +46,65 @@ def chat(req: ChatRequest, current_user: User = Depends(get_current_user)):
                 print(f"Model {model_name} failed: {model_error}")
                 continue
         
-        return {"answer": f"🤖 All Gemini models failed. Query: '{req.query}'", "citations": []}
+        return {"answer": f"🤖 All Gemini models failed. Query: '{query}'", "citations": []}
         
     except Exception as e:
         print(f"Chat error: {e}")
         return {"answer": f"❌ Error: {str(e)}", "citations": []}
+
+
+# ---------- Streaming (SSE) ----------
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _citations(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{
+        "n": n,
+        "id": h["id"],
+        "score": h["score"],
+        "meta": h["meta"],
+        "snippet": (h.get("text") or "")[:300],
+    } for n, h in enumerate(hits, 1)]
+
+@router.post("/chat/stream")
+async def chat_stream(req: ChatStreamRequest, current_user: User = Depends(get_current_user)):
+    """
+    Server-sent events:
+      event: citations  -> list of retrieved chunks, numbered as in the prompt
+      event: token      -> {"text": ...} per model fragment, as it arrives
+      event: done       -> {"answer": full answer}
+      event: error      -> {"error": ...} (the stream ends after it)
+    """
+    try:
+        build_where(req.filters)  # bad filters are a 400, not a broken stream
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def events():
+        try:
+            hits = await aretrieve_topk(req.query, top_k=req.top_k, mmr_lambda=req.mmr_lambda,
+                                        mmr_pool=req.mmr_pool, filters=req.filters)
+        except Exception as e:
+            print(f"Chat stream retrieval error: {e}")
+            yield _sse("error", {"error": f"Retrieval failed: {e}"})
+            return
+        yield _sse("citations", _citations(hits))
+
+        parts: List[str] = []
+        try:
+            # the model client is blocking; pull each fragment on a worker thread
+            tokens = get_llm().stream(build_prompt(req.query, hits), system=SYSTEM_PROMPT)
+            async for text in iterate_in_threadpool(tokens):
+                parts.append(text)
+                yield _sse("token", {"text": text})
+        except Exception as e:
+            print(f"Chat stream error: {e}")
+            yield _sse("error", {"error": str(e)})
+            return
+        yield _sse("done", {"answer": "".join(parts)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
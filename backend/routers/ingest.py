@@ -1,5 +1,7 @@
-from fastapi import APIRouter, UploadFile, File, Depends
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pathlib import Path
+from typing import Optional
 from core.auth import get_current_user
 from core.models import IngestResponse, User
 from core.settings import settings
@@ -11,7 +13,11 @@ from datetime import datetime
 from services import uploads_index
 from rag.retriever import ingest_pdf_file
 from rag.retriever import _sha1
-from rag.retriever import _file_fingerprint
+from rag.retriever import _file_fingerprint, ingest_lock
+from rag.stages import StageTimer
+from services.jobs import QueueClosed, QueueFull, get_job_queue
+from services.storage import UploadTooLarge, delete_local, store_blob
+import functools, time
 
 router = APIRouter(tags=["ingest"])
 
@@ -76,81 +82,154 @@ CSV_DIR.mkdir(parents=True, exist_ok=True)
 #     return {"file": str(dest), "rows_ingested": count}
 
 
-@router.post("/upload")
-async def ingest_upload(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
-    name = (file.filename or "").lower()
-    content = await file.read()
-
-    _id = str(uuid4())
-    now = datetime.utcnow().isoformat() + "Z"
-
-    def index_and_return(file_type: str, path: Path, added: int):
-        """Helper: register upload, mark ingested, return response"""
-        stat = path.stat()
-        file_fp = _file_fingerprint(path)
-
-        uploads_index.add_upload({
-            "id": _id,
-            "original_filename": name,
-            "stored_path": str(path),
-            "size_bytes": int(stat.st_size),
-            "created_at": now,
-            "ingested": False,
-            "error": None,
-            "chunk_count": 0,
-            "file_type": file_type,
-            "file_fingerprint": file_fp,
-        })
-
-        uploads_index.mark_ingested(_id, chunk_count=int(added), error=None)
-        return {"type": file_type, "file": name, "chunks": added}
-
-    # ---------- PDF ----------
-    if name.endswith(".pdf") or file.content_type == "application/pdf":
-        path = PDF_DIR / name
-        path.write_bytes(content)
+def _detect_type(name: str, content_type: str) -> Optional[str]:
+    if name.endswith(".pdf") or content_type == "application/pdf":
+        return "pdf"
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    if name.endswith(".txt") or content_type in ("text/plain",):
+        return "txt"
+    if name.endswith(".docx") or content_type in (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ):
+        return "docx"
+    return None
+
+INGESTERS = {
+    "pdf": ingest_pdf_file,
+    "csv": ingest_csv_file,
+    "txt": ingest_txt_file,
+    "docx": ingest_docx_file,
+}
+
+def _run_ingest(upload_id: str, file_type: str, path: Path, name: str, doc_key: str) -> None:
+    """Job body: ingest one stored upload, recording stage/progress on its index entry."""
+    last = {"stage": None, "progress": -1}
+
+    def progress(stage: str, done: float) -> None:
+        pct = min(99, int(done * 100))   # 100 only once the record says done
+        # one row update per write, but still only on a new stage or whole percent
+        if stage != last["stage"] or pct != last["progress"]:
+            last.update(stage=stage, progress=pct)
+            uploads_index.update_upload(upload_id, stage=stage, progress=pct)
+
+    timer = StageTimer()
+
+    def metrics() -> dict:
+        return {**timer.as_dict(), "wall_s": time.perf_counter() - t0}
+
+    # doc_key = the logical document, so a new version is diffed against the
+    # chunks of the last one. Another upload of it may be ingesting right now:
+    # wait for it, then share its chunks if the bytes are the same.
+    with ingest_lock(doc_key, on_wait=lambda: uploads_index.update_upload(upload_id, stage="waiting")):
+        if uploads_index.link_upload(upload_id):
+            return
+        uploads_index.update_upload(upload_id, status="running", stage="extracting", progress=0)
+        t0 = time.perf_counter()
         try:
-            added = ingest_pdf_file(path, delete_previous_for_same_file=True)
-            return index_and_return("pdf", path, added)
+            added = INGESTERS[file_type](path, delete_previous_for_same_file=True, doc_key=doc_key,
+                                         progress=progress, display_name=name, timer=timer)
         except Exception as e:
-            uploads_index.mark_ingested(_id, chunk_count=0, error=str(e))
+            uploads_index.mark_ingested(upload_id, chunk_count=0, error=str(e), metrics=metrics())
             raise
+        uploads_index.mark_ingested(upload_id, chunk_count=int(added), error=None, metrics=metrics())
+        # the previous versions' entries go, and with them their blob references
+        for blob in uploads_index.supersede(upload_id):
+            delete_local(blob)
+
+
+@router.post("/upload", status_code=202)
+async def ingest_upload(file: UploadFile = File(...), doc_id: Optional[str] = Form(None),
+                        current_user: User = Depends(get_current_user)):
+    """
+    Store the file and queue it for ingestion; returns at once with a job id
+    to poll at GET /api/upload/{job_id}. 415 for an unsupported type, 429
+    when the ingest queue is full.
+
+    `doc_id` names the document (default: the file name); uploading it again
+    replaces the previous version, re-embedding only the chunks that changed.
+    """
+    name = (file.filename or "").lower()
+    doc_id = (doc_id or "").strip() or name
+    file_type = _detect_type(name, file.content_type or "")
+    if file_type is None:
+        raise HTTPException(status_code=415, detail=f"Unsupported file type: {file.content_type} / {name}")
 
-    # ---------- CSV ----------
-    elif name.endswith(".csv") or "csv" in (file.content_type or ""):
-        path = CSV_DIR / name
-        path.write_bytes(content)
-        try:
-            added = ingest_csv_file(path, delete_previous_for_same_file=True)
-            return index_and_return("csv", path, added)
-        except Exception as e:
-            uploads_index.mark_ingested(_id, chunk_count=0, error=str(e))
-            raise
+    jobs = get_job_queue()
+    # cheap early refusal before taking the body; submit() below is the real check
+    if jobs.full():
+        raise HTTPException(status_code=429, detail="Ingest queue is full, retry later",
+                            headers={"Retry-After": "30"})
 
-    # ---------- TXT ----------
-    elif name.endswith(".txt") or file.content_type in ("text/plain",):
-        path = TXT_DIR / name
-        path.write_bytes(content)
-        try:
-            added = ingest_txt_file(path, delete_previous_for_same_file=True)
-            return index_and_return("txt", path, added)
-        except Exception as e:
-            uploads_index.mark_ingested(_id, chunk_count=0, error=str(e))
-            raise
+    limit = settings.MAX_UPLOAD_BYTES
+    if limit and (getattr(file, "size", None) or 0) > limit:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the {limit}-byte limit")
 
-    # ---------- DOCX ----------
-    elif name.endswith(".docx") or file.content_type in (
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-    ):
-        path = DOCX_DIR / name
-        path.write_bytes(content)
-        try:
-            added = ingest_docx_file(path, delete_previous_for_same_file=True)
-            return index_and_return("docx", path, added)
-        except Exception as e:
-            uploads_index.mark_ingested(_id, chunk_count=0, error=str(e))
-            raise
+    _id = str(uuid4())
+    now = datetime.utcnow().isoformat() + "Z"
 
-    # ---------- Unsupported ----------
-    else:
-        return {"error": f"Unsupported file type: {file.content_type} / {name}"}
+    # streamed in fixed blocks (sha256 + size on the way) into the blob store
+    try:
+        stored = await run_in_threadpool(store_blob, file.file, limit)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    path = stored.path
+
+    entry = {
+        "id": _id,
+        "original_filename": name,
+        "stored_path": str(path),
+        "size_bytes": stored.size,
+        "sha256": stored.sha256,
+        "created_at": now,
+        "ingested": False,
+        "error": None,
+        "chunk_count": 0,
+        "file_type": file_type,
+        "file_fingerprint": _file_fingerprint(path),
+        "doc_key": f"upload:{doc_id}",
+        "status": "queued",
+        "stage": "queued",
+        "progress": 0,
+    }
+    # same bytes already ingested: share those chunks, nothing to queue.
+    # Index writes are SQLite transactions that may wait on a lock: off the event loop
+    twin = await run_in_threadpool(uploads_index.add_or_link_upload, entry)
+    if twin:
+        return {"job_id": _id, "status": "done", "type": file_type, "file": name, "doc_id": doc_id,
+                "chunks": entry["chunk_count"], "duplicate_of": twin.get("id")}
+
+    try:
+        jobs.submit(_id, functools.partial(_run_ingest, _id, file_type, path, name, entry["doc_key"]))
+    except (QueueFull, QueueClosed) as e:
+        _, refs, _ = await run_in_threadpool(uploads_index.release_upload, _id)
+        if not refs:
+            await run_in_threadpool(delete_local, str(path))
+        if isinstance(e, QueueFull):
+            raise HTTPException(status_code=429, detail="Ingest queue is full, retry later",
+                                headers={"Retry-After": "30"})
+        raise HTTPException(status_code=503, detail="Server is shutting down, retry later",
+                            headers={"Retry-After": "30"})
+
+    return {"job_id": _id, "status": "queued", "type": file_type, "file": name, "doc_id": doc_id}
+
+
+@router.get("/upload/{job_id}")
+def upload_status(job_id: str, current_user: User = Depends(get_current_user)):
+    """Ingestion job status: queued -> running (stage, progress %) -> done | failed."""
+    row = uploads_index.get_upload(job_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job_id,
+        "status": row.get("status", "done" if row.get("ingested") else "failed"),
+        "stage": row.get("stage"),
+        "progress": row.get("progress", 100 if row.get("ingested") else 0),
+        "queue_position": get_job_queue().position(job_id),
+        "chunks": row.get("chunk_count", 0),
+        "error": row.get("error"),
+        "type": row.get("file_type"),
+        "file": row.get("original_filename"),
+        "updated_at": row.get("updated_at"),
+        "metrics": row.get("metrics"),
+    }
@@ -0,0 +1,34 @@
+# backend/routers/stats.py
+from fastapi import APIRouter, Depends
+from typing import Any, Dict
+from core.auth import get_current_user
+from rag.embedder import cache_stats
+from rag.ocr import ocr_cache_stats
+from rag.retriever import retrieval_cache_stats
+from rag.stages import summarize
+from services import uploads_index
+from services.jobs import get_job_queue
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+@router.get("/cache", dependencies=[Depends(get_current_user)])
+def cache() -> Dict[str, Any]:
+    return {
+        "embeddings": cache_stats(),
+        "retrieval": retrieval_cache_stats(),
+        "ocr": ocr_cache_stats(),
+    }
+
+# runs behind the ingest figures: every stats call parses this many metrics records at most
+THROUGHPUT_RUNS = 1000
+RECENT_RUNS = 20
+
+@router.get("/ingest", dependencies=[Depends(get_current_user)])
+def ingest() -> Dict[str, Any]:
+    """Queue state plus ingest throughput and per-stage time, over the last 1000 runs and the last 20."""
+    runs = uploads_index.ingest_metrics(limit=THROUGHPUT_RUNS)
+    return {
+        "queue": get_job_queue().stats(),
+        "throughput": summarize(runs),
+        "recent": summarize(runs[-RECENT_RUNS:]),
+    }
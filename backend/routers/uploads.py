@@ -1,22 +1,45 @@
 # backend/routers/uploads.py
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Dict, Any, Optional
 from core.auth import get_current_user
 from services import uploads_index
-from rag.store_chroma import get_collection
+from rag.store_chroma import get_collection, delete_chunks, where_eq
+from rag.manifest import get_manifest
 from services.storage import delete_local
 from pathlib import Path
 
 router = APIRouter(prefix="/uploads", tags=["uploads"])
 
 @router.get("", dependencies=[Depends(get_current_user)])
-def list_uploads() -> List[Dict[str, Any]]:
-    return uploads_index.list_uploads()
+def list_uploads(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    file_type: Optional[str] = None,
+    ingested: Optional[bool] = None,
+    sha256: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Newest first; when more remain, X-Next-Cursor holds the `cursor` for the next page."""
+    try:
+        rows, next_cursor = uploads_index.page_uploads(
+            limit, cursor, status=status, file_type=file_type, ingested=ingested, sha256=sha256)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 @router.delete("/{upload_id}", status_code=204, dependencies=[Depends(get_current_user)])
 def delete_upload(upload_id: str):
-    # 1️⃣ Get the index entry
-    row = uploads_index.get_upload(upload_id)
+    # 0️⃣ A queued/running job would keep writing chunks after we delete them
+    current = uploads_index.get_upload(upload_id)
+    if current and current.get("status") in ("queued", "running"):
+        raise HTTPException(status_code=409, detail="Upload is still being ingested; delete it once it has finished")
+
+    # 1️⃣ Drop the index entry; other uploads of the same content keep the file,
+    # other uploads of the same document keep its vectors
+    row, blob_refs, doc_refs = uploads_index.release_upload(upload_id)
     print(row)
     if not row:
         raise HTTPException(status_code=404, detail="Upload not found")
@@ -27,7 +50,9 @@ def delete_upload(upload_id: str):
     print(file_fp, "file_fp")
 
     # 2️⃣ Delete the physical file first (folder)
-    if file_path:
+    if blob_refs:
+        print(f"[delete_upload] {row.get('sha256')} still referenced by {blob_refs} upload(s); keeping blob")
+    elif file_path:
         try:
             p = Path(file_path)
             print(p.exists(), "p.exists()")
@@ -37,10 +62,12 @@ def delete_upload(upload_id: str):
             # non-fatal — log if needed
             print(f"[delete_upload] Failed to delete file {file_path}: {e}")
 
-    # 3️⃣ Remove from uploads.json index
-    uploads_index.remove_upload(upload_id)
+    doc_key = row.get("doc_key") or file_path
+    if doc_refs:
+        print(f"[delete_upload] {doc_key} still referenced by {doc_refs} upload(s); keeping vectors")
+        return
 
-    # 4️⃣ Delete vectors for this file (by fingerprint if available)
+    # 3️⃣ Delete vectors for this document (by fingerprint if it predates the manifest)
     try:
         col = get_collection()
         sample_result = col.get(limit=1, include=['metadatas'])
@@ -63,27 +90,37 @@ def delete_upload(upload_id: str):
 
         candidate_ids: list[str] = []
 
+        # 0) Exact: the chunk ids the document's manifest owns
+        if doc_key:
+            ids = sorted(get_manifest().remove(doc_key))
+            print("ids by manifest:", len(ids))
+            candidate_ids.extend(ids)
+
+        # Older uploads, keyed by their stored path, may predate the manifest.
+        # Not for others: the same bytes may back another document
+        legacy = doc_key == path
+
         # 1) Best: by fingerprint
-        if fp:
+        if not candidate_ids and legacy and fp:
             ids = get_ids({"file_fingerprint": fp})
             print("ids by fingerprint:", len(ids))
             candidate_ids.extend(ids)
 
         # 2) Fallback: by full path (+source if available)
-        if not candidate_ids and path:
+        if not candidate_ids and legacy and path:
             filt = {"path": path}
             if src:
                 filt["source"] = src
-            ids = get_ids(filt)
+            ids = get_ids(where_eq(**filt))
             print("ids by path/src:", len(ids), filt)
             candidate_ids.extend(ids)
 
         # 3) Fallback: by file_name (+source)
-        if not candidate_ids and name:
+        if not candidate_ids and legacy and name:
             filt = {"file_name": name}
             if src:
                 filt["source"] = src
-            ids = get_ids(filt)
+            ids = get_ids(where_eq(**filt))
             print("ids by file_name/src:", len(ids), filt)
             candidate_ids.extend(ids)
 
@@ -92,7 +129,7 @@ def delete_upload(upload_id: str):
         print("total ids to delete:", len(candidate_ids))
 
         if candidate_ids:
-            col.delete(ids=candidate_ids)
+            delete_chunks(col, candidate_ids)
             # verify
             remaining = col.get(ids=candidate_ids, include=[])
             still_there = len(remaining.get("ids", []) or [])
@@ -0,0 +1,122 @@
+# backend/services/jobs.py
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import threading
+
+from core.settings import settings
+
+
+class QueueFull(Exception):
+    """Every worker is busy and the waiting line is at its limit."""
+
+
+class QueueClosed(Exception):
+    """The queue is shutting down and takes no new jobs."""
+
+
+class JobQueue:
+    """
+    Bounded background pool for ingestion jobs. At most `workers` jobs run
+    at once and at most `max_queued` wait behind them; submit() refuses
+    anything beyond that instead of letting work pile up in memory, so the
+    caller can answer 429 and the client retries later.
+
+    Jobs report their own progress (see routers/ingest.py); the queue only
+    knows what is running and what is waiting.
+    """
+
+    def __init__(self, workers: int, max_queued: int):
+        self.workers = max(1, int(workers))
+        self.max_queued = max(0, int(max_queued))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_queued)
+        self._lock = threading.Lock()
+        self._queued: Dict[str, None] = {}
+        self._running: Dict[str, None] = {}
+        self._closed = False
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, job_id: str, fn: Callable[[], Any]) -> None:
+        with self._lock:
+            if self._closed:
+                raise QueueClosed("ingest queue is shutting down")
+            if not self._slots.acquire(blocking=False):
+                self.rejected += 1
+                raise QueueFull(f"ingest queue is full ({self.workers} running, {self.max_queued} waiting)")
+            self._queued[job_id] = None
+        try:
+            self._pool.submit(self._run, job_id, fn)
+        except RuntimeError:
+            with self._lock:
+                self._queued.pop(job_id, None)
+            self._slots.release()
+            raise QueueClosed("ingest queue is shutting down")
+
+    def full(self) -> bool:
+        """Would submit() refuse right now? A yes counts as a rejection."""
+        with self._lock:
+            full = len(self._queued) + len(self._running) >= self.workers + self.max_queued
+            if full:
+                self.rejected += 1
+            return full
+
+    def _run(self, job_id: str, fn: Callable[[], Any]) -> None:
+        with self._lock:
+            self._queued.pop(job_id, None)
+            self._running[job_id] = None
+        try:
+            fn()
+            ok = True
+        except Exception as e:
+            # the job records its own error; this is just the last line of defence
+            print(f"[jobs] {job_id} failed: {e}")
+            ok = False
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+            self._slots.release()
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based place in the waiting line, 0 while running, None if unknown."""
+        with self._lock:
+            if job_id in self._running:
+                return 0
+            for i, k in enumerate(self._queued, start=1):
+                if k == job_id:
+                    return i
+        return None
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            self._closed = True
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queued": self.max_queued,
+                "running": len(self._running),
+                "queued": len(self._queued),
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+            }
+
+
+_QUEUE: Optional[JobQueue] = None
+_QUEUE_LOCK = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            _QUEUE = JobQueue(settings.INGEST_WORKERS, settings.INGEST_QUEUE_MAX)
+        return _QUEUE
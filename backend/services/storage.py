@@ -1,5 +1,81 @@
 # backend/services/storage.py
+from dataclasses import dataclass
 from pathlib import Path
+from typing import BinaryIO, Tuple
+import hashlib, os, tempfile
+
+from core.settings import settings
+
+BLOCK_SIZE = 1 << 20   # 1 MB: peak memory per upload, whatever its size
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit}-byte limit")
+        self.limit = limit
+
+
+@dataclass
+class StoredFile:
+    path: Path
+    size: int
+    sha256: str
+    existed: bool = False
+
+
+def _spool(src: BinaryIO, directory: Path, max_bytes: int) -> Tuple[str, int, str]:
+    """Copy `src` into a temp file in `directory` block by block; returns (temp path, size, sha256)."""
+    directory.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    h, size = hashlib.sha256(), 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                block = src.read(BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if max_bytes and size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                h.update(block)
+                out.write(block)
+    except BaseException:
+        _unlink(tmp)
+        raise
+    return tmp, size, h.hexdigest()
+
+
+def _unlink(path) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# ---------- Content-addressed blobs ----------
+BLOB_DIR = Path(settings.DATA_DIR) / "blobs"
+
+def blob_path(sha256: str) -> Path:
+    return BLOB_DIR / sha256[:2] / sha256
+
+def store_blob(src: BinaryIO, max_bytes: int = 0) -> StoredFile:
+    """
+    Copy `src` into the blob store block by block, hashing and counting in
+    the same pass; it lands at blobs/<sha[:2]>/<sha> via a temp file and
+    os.replace(), so a blob is never partial. The same bytes uploaded
+    twice, under any name, are stored once; `existed` tells the caller the
+    content was already there. Raises UploadTooLarge (and leaves nothing
+    behind) once more than `max_bytes` arrive; 0 means no limit.
+    """
+    tmp, size, sha = _spool(src, BLOB_DIR, max_bytes)
+    dest = blob_path(sha)
+    if dest.exists():
+        _unlink(tmp)
+        return StoredFile(dest, size, sha, existed=True)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(tmp, dest)
+    return StoredFile(dest, size, sha)
+
 
 def delete_local(path_str: str) -> None:
     try:
@@ -1,61 +1,307 @@
 # backend/services/uploads_index.py
 from __future__ import annotations
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from datetime import datetime
-import json
+import base64, json, os, socket, threading, time, uuid
 
+from sqlalchemy import and_, delete, func, inspect, or_, select, text, update
+from sqlalchemy.orm import Session
+
+from core.database import SessionLocal, Upload, schema_lock
 from core.settings import settings
 
 DATA_DIR = Path(settings.DATA_DIR)
+# the index used to be this file; it is imported into the uploads table once
 INDEX_PATH = DATA_DIR / "uploads.json"
 INDEX_PATH.parent.mkdir(parents=True, exist_ok=True)
+# SQLite lets one writer in at a time; serialise this process's writers so
+# a read-then-write never has to upgrade its lock against another thread
+_LOCK = threading.RLock()
+_READY = False
+# this process, as the owner of the jobs it queues
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+_UNFINISHED = ("queued", "running")
+
+_COLUMNS = [c.name for c in Upload.__table__.columns if c.name != "extra"]
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + "Z"
+
+def _row(entry: Dict[str, Any]) -> Upload:
+    fields = {k: v for k, v in entry.items() if k in _COLUMNS}
+    extra = {k: v for k, v in entry.items() if k not in _COLUMNS}
+    fields.setdefault("created_at", _now())
+    return Upload(**fields, extra=extra or None)
 
-def _load() -> List[Dict[str, Any]]:
-    if not INDEX_PATH.exists():
-        return []
+def _dict(u: Upload) -> Dict[str, Any]:
+    out = {c: getattr(u, c) for c in _COLUMNS}
+    out.update(u.extra or {})
+    return out
+
+def _migrate(db: Session) -> int:
+    """Import a legacy uploads.json (records not already in the table, so re-running is harmless)."""
     try:
-        return json.loads(INDEX_PATH.read_text(encoding="utf-8"))
-    except Exception:
-        return []
+        rows = json.loads(INDEX_PATH.read_text(encoding="utf-8"))
+    except FileNotFoundError:   # another worker got here first
+        return 0
+    except Exception as e:
+        print(f"[uploads_index] could not read {INDEX_PATH}: {e}")
+        rows = []
+    have = set(db.scalars(select(Upload.id)))
+    n = 0
+    for r in rows:
+        if isinstance(r, dict) and r.get("id") and r["id"] not in have:
+            r.setdefault("created_at", "")
+            r["ingested"] = bool(r.get("ingested"))
+            r["chunk_count"] = int(r.get("chunk_count") or 0)
+            db.add(_row(r))
+            have.add(r["id"])
+            n += 1
+    return n
 
-def _save(rows: List[Dict[str, Any]]) -> None:
-    INDEX_PATH.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+def _ready() -> None:
+    global _READY
+    if _READY:
+        return
+    with _LOCK:
+        if _READY:
+            return
+        # other worker processes may be doing the same: the lock makes it one at a time
+        with schema_lock() as conn:
+            Upload.__table__.create(bind=conn, checkfirst=True)
+            # tables from before job leases / document keys
+            table = Upload.__tablename__
+            cols = {c["name"] for c in inspect(conn).get_columns(table)}
+            for name, kind in (("owner", "VARCHAR"), ("lease_until", "FLOAT"), ("doc_key", "VARCHAR")):
+                if name not in cols:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {kind}"))
+            if "doc_key" not in cols:
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_doc_key ON {table} (doc_key)"))
+            # older uploads were ingested under their stored path
+            conn.execute(update(Upload).where(Upload.doc_key.is_(None)).values(doc_key=Upload.stored_path))
+            n = None
+            if INDEX_PATH.exists():
+                db = Session(bind=conn)
+                n = _migrate(db)
+                db.flush()
+        if n is not None:
+            try:
+                INDEX_PATH.replace(INDEX_PATH.with_suffix(".json.migrated"))
+            except FileNotFoundError:   # renamed by another worker
+                pass
+            if n:
+                print(f"[uploads_index] imported {n} upload(s) from {INDEX_PATH}")
+        _READY = True
+
+@contextmanager
+def _session() -> Iterator[Session]:
+    """One transaction: committed on success, rolled back on error."""
+    _ready()
+    with SessionLocal() as db, db.begin():
+        yield db
 
 def list_uploads() -> List[Dict[str, Any]]:
-    rows = _load()
-    rows.sort(key=lambda r: r.get("created_at",""), reverse=True)
-    return rows
+    with _session() as db:
+        rows = db.scalars(select(Upload).order_by(Upload.created_at.desc(), Upload.id.desc()))
+        return [_dict(u) for u in rows]
+
+# ---------- Paging ----------
+def _encode_cursor(u: Upload) -> str:
+    raw = json.dumps([u.created_at, u.id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, upload_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(created_at), str(upload_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+def page_uploads(limit: int = 100, cursor: Optional[str] = None, *, status: Optional[str] = None,
+                 file_type: Optional[str] = None, ingested: Optional[bool] = None,
+                 sha256: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Newest first, `limit` at a time. Pass the returned cursor back to get
+    the next page (None on the last one); ValueError on a bad cursor.
+    """
+    q = select(Upload)
+    for col, value in ((Upload.status, status), (Upload.file_type, file_type),
+                       (Upload.ingested, ingested), (Upload.sha256, sha256)):
+        if value is not None:
+            q = q.where(col == value)
+    if cursor:
+        created_at, upload_id = _decode_cursor(cursor)
+        q = q.where(or_(Upload.created_at < created_at,
+                        and_(Upload.created_at == created_at, Upload.id < upload_id)))
+    q = q.order_by(Upload.created_at.desc(), Upload.id.desc()).limit(limit + 1)
+    with _session() as db:
+        rows = list(db.scalars(q))
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return [_dict(u) for u in rows], (_encode_cursor(rows[-1]) if more else None)
 
 def add_upload(entry: Dict[str, Any]) -> None:
-    rows = _load()
-    rows.append(entry)
-    _save(rows)
+    with _LOCK, _session() as db:
+        db.add(_row(entry))
 
 def get_upload(upload_id: str) -> Optional[Dict[str, Any]]:
-    for r in _load():
-        if r.get("id") == upload_id:
-            return r
-    return None
+    with _session() as db:
+        u = db.get(Upload, upload_id)
+        return _dict(u) if u else None
 
 def remove_upload(upload_id: str) -> bool:
-    rows = _load()
-    new_rows = [r for r in rows if r.get("id") != upload_id]
-    if len(new_rows) == len(rows):
-        return False
-    _save(new_rows)
-    return True
-
-def mark_ingested(upload_id: str, *, chunk_count: int, error: Optional[str]=None) -> None:
-    rows = _load()
-    changed = False
-    for r in rows:
-        if r.get("id") == upload_id:
-            r["ingested"] = error is None
-            r["error"] = error
-            r["chunk_count"] = int(chunk_count)
-            r["updated_at"] = datetime.utcnow().isoformat() + "Z"
-            changed = True
-            break
-    if changed:
-        _save(rows)
+    with _LOCK, _session() as db:
+        return db.execute(delete(Upload).where(Upload.id == upload_id)).rowcount > 0
+
+def _link(db: Session, u: Upload) -> Optional[Upload]:
+    """
+    Record `u` as sharing the chunks of an ingested upload of the same
+    document with the same sha256, if there is one. Not while another
+    version of the document is waiting to ingest: `u` must then run after it.
+    """
+    if not u.sha256 or not u.doc_key:
+        return None
+    pending = db.scalars(
+        select(Upload.id).where(Upload.doc_key == u.doc_key, Upload.status.in_(_UNFINISHED),
+                                Upload.sha256 != u.sha256, Upload.id != u.id).limit(1)
+    ).first()
+    if pending is not None:
+        return None
+    twin = db.scalars(
+        select(Upload).where(Upload.doc_key == u.doc_key, Upload.sha256 == u.sha256,
+                             Upload.ingested.is_(True), Upload.id != u.id).limit(1)
+    ).first()
+    if twin is not None:
+        u.ingested, u.error, u.chunk_count, u.linked_to = True, None, twin.chunk_count or 0, twin.id
+        u.status, u.stage, u.progress, u.updated_at = "done", "done", 100, _now()
+    return twin
+
+def add_or_link_upload(entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Register an upload; if an ingested upload of the same document (doc_key)
+    with the same sha256 exists, the new entry shares its chunks and is
+    recorded as done right away.
+    Returns that twin (None when the entry still needs ingesting; a twin
+    still in flight is caught by link_upload when the job runs).
+    """
+    if entry.get("status") in _UNFINISHED:
+        entry.setdefault("owner", OWNER)
+        entry.setdefault("lease_until", time.time() + settings.INGEST_LEASE_SECONDS)
+    with _LOCK, _session() as db:
+        # insert first: the write lock is then held while we look for a twin
+        u = _row(entry)
+        db.add(u)
+        db.flush()
+        twin = _link(db, u)
+        if twin is None:
+            return None
+        entry.update(_dict(u))
+        return _dict(twin)
+
+def link_upload(upload_id: str) -> Optional[Dict[str, Any]]:
+    """add_or_link_upload for a queued entry: link it now if its twin has finished since."""
+    with _LOCK, _session() as db:
+        u = db.get(Upload, upload_id)
+        twin = _link(db, u) if u is not None else None
+        return _dict(twin) if twin is not None else None
+
+def _refs(db: Session, col, value: Any) -> int:
+    if not value:
+        return 0
+    return db.scalar(select(func.count()).select_from(Upload).where(col == value))
+
+def release_upload(upload_id: str) -> Tuple[Optional[Dict[str, Any]], int, int]:
+    """
+    Remove an entry; returns it, how many other entries still reference the
+    same blob (sha256) and how many the same document (doc_key). Only at 0
+    may the blob, respectively the document's vectors, go.
+    """
+    with _LOCK, _session() as db:
+        u = db.get(Upload, upload_id)
+        if u is None:
+            return None, 0, 0
+        row = _dict(u)
+        db.delete(u)
+        db.flush()
+        return row, _refs(db, Upload.sha256, row.get("sha256")), _refs(db, Upload.doc_key, row.get("doc_key"))
+
+def supersede(upload_id: str) -> List[str]:
+    """
+    `upload_id` now holds its document's chunks: drop the document's other
+    finished entries (older versions; same-content uploads stay). Returns
+    the stored paths of blobs nothing references any more.
+    """
+    with _LOCK, _session() as db:
+        u = db.get(Upload, upload_id)
+        if u is None or not u.doc_key:
+            return []
+        old = list(db.scalars(select(Upload).where(
+            Upload.doc_key == u.doc_key, Upload.id != u.id,
+            Upload.status.not_in(_UNFINISHED), Upload.sha256 != u.sha256)))
+        for o in old:
+            db.delete(o)
+        db.flush()
+        freed = {}
+        for o in old:
+            if o.stored_path and not _refs(db, Upload.sha256, o.sha256):
+                freed[o.stored_path] = None
+        return list(freed)
+
+def update_upload(upload_id: str, **fields: Any) -> bool:
+    """Set fields on one record (job status, stage, progress, ...)."""
+    values = {k: v for k, v in fields.items() if k in _COLUMNS}
+    extra = {k: v for k, v in fields.items() if k not in _COLUMNS}
+    values["updated_at"] = _now()
+    with _LOCK, _session() as db:
+        if extra:
+            u = db.get(Upload, upload_id)
+            if u is None:
+                return False
+            values["extra"] = {**(u.extra or {}), **extra}
+        return db.execute(update(Upload).where(Upload.id == upload_id).values(**values)).rowcount > 0
+
+def mark_ingested(upload_id: str, *, chunk_count: int, error: Optional[str]=None,
+                  metrics: Optional[Dict[str, Any]]=None) -> None:
+    update_upload(
+        upload_id,
+        **({"metrics": metrics} if metrics is not None else {}),
+        ingested=error is None,
+        error=error,
+        chunk_count=int(chunk_count),
+        status="done" if error is None else "failed",
+        stage="done" if error is None else "failed",
+        **({"progress": 100} if error is None else {}),
+    )
+
+def renew_leases() -> int:
+    """Extend the lease on this process's queued/running jobs."""
+    with _LOCK, _session() as db:
+        return db.execute(
+            update(Upload).where(Upload.owner == OWNER, Upload.status.in_(_UNFINISHED)).values(
+                lease_until=time.time() + settings.INGEST_LEASE_SECONDS)
+        ).rowcount
+
+def fail_unfinished(reason: str) -> int:
+    """
+    Jobs still queued/running whose owner stopped renewing their lease
+    will never finish; say so. Jobs of live processes are left alone.
+    """
+    with _LOCK, _session() as db:
+        return db.execute(
+            update(Upload).where(
+                Upload.status.in_(_UNFINISHED),
+                or_(Upload.lease_until.is_(None), Upload.lease_until < time.time()),
+            ).values(status="failed", stage="failed", ingested=False, error=reason, updated_at=_now())
+        ).rowcount
+
+def ingest_metrics(limit: Optional[int]=None) -> List[Dict[str, Any]]:
+    """Per-run ingest metrics of finished uploads, oldest first; the last `limit` if given."""
+    q = select(Upload.metrics).where(Upload.metrics.is_not(None)).order_by(
+        Upload.created_at.desc(), Upload.id.desc())
+    if limit:
+        q = q.limit(limit)
+    with _session() as db:
+        runs = list(db.scalars(q))
+    return runs[::-1]
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# import rag, core, ... the way app.py does, from the backend directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
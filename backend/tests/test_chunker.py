@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from rag.chunker import chunk_text, iter_chunks
+
+WORDS = ("policy audit control data retention key rotation access review vendor "
+         "risk incident breach report logs encryption customer consent").split()
+
+
+def _paragraphs(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+
+    def sentence():
+        return " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(6, 20))).capitalize() + "."
+
+    return [" ".join(sentence() for _ in range(rnd.randint(1, 12))) for _ in range(n)]
+
+
+def _surviving(before: str, after: str) -> float:
+    """Share of the chunks of `before` that `after` still has (chunk ids hash the chunk text)."""
+    old, new = chunk_text(before), set(chunk_text(after))
+    return sum(c in new for c in old) / len(old)
+
+
+# boilerplate clauses longer than a chunk: the same sentence over and over
+CLAUSES = [f"Paragraph {i} on key rotation and retention of audit logs. " * 20 for i in range(60)]
+
+
+@pytest.mark.parametrize("paras", [_paragraphs(200), CLAUSES], ids=["prose", "clauses"])
+@pytest.mark.parametrize("edited", [1, 2, 5, 9])
+def test_editing_an_early_paragraph_keeps_later_chunks(paras, edited):
+    changed = list(paras)
+    changed[edited] = "An edited early paragraph about a wholly different control. " * 3
+    assert _surviving("\n\n".join(paras), "\n\n".join(changed)) > 0.9
+
+
+@pytest.mark.parametrize("at", [100, 300, 1000])
+def test_inserting_words_keeps_later_chunks_without_punctuation(at):
+    rnd = random.Random(3)
+    words = [rnd.choice(WORDS) for _ in range(8000)]
+    assert _surviving(" ".join(words), " ".join(words[:at] + ["inserted", "words"] + words[at:])) > 0.9
+
+
+def test_chunks_do_not_depend_on_how_the_text_is_split():
+    text = "\n\n".join(_paragraphs(100))
+    pieces = [text[i:i + 777] for i in range(0, len(text), 777)]
+    assert list(iter_chunks(pieces)) == chunk_text(text)